@@ -0,0 +1,14 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def shell():
+    """The shiny-shell.py module, which can't be imported by name"""
+    path = Path(__file__).with_name("shiny-shell.py")
+    spec = importlib.util.spec_from_file_location("shiny_shell", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
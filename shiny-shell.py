@@ -2,9 +2,1430 @@ from shiny import App, reactive, render, ui
 import subprocess
 import os
 import socket
-import glob
-import shlex
+import bisect
+from array import array
+import collections
+import fnmatch
+import gzip
+import hashlib
+import shutil
 import json
+import re
+import asyncio
+import base64
+import secrets
+import signal
+import stat
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, quote
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+
+# Sessions with no commands or tab completions for this many seconds have
+# their scrollback spilled to disk and their child processes killed
+IDLE_TIMEOUT = float(os.environ.get("SHINY_SHELL_IDLE_TIMEOUT", 30 * 60))
+REAPER_INTERVAL = float(os.environ.get("SHINY_SHELL_REAPER_INTERVAL", 60))
+# Seconds a process group gets to exit after SIGTERM before it is SIGKILLed
+KILL_GRACE_PERIOD = 2
+# Spilled scrollback can hold secrets from command output, so it goes in a
+# per-user directory that only that user can read
+SPILL_DIR = os.environ.get(
+    "SHINY_SHELL_SPILL_DIR",
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "shiny-shell", "spill"
+    ),
+)
+
+# Tab on a wildcard word stops scanning after this many matches or seconds,
+# so `**` against a huge tree can't hang the session
+GLOB_MAX_RESULTS = int(os.environ.get("SHINY_SHELL_GLOB_MAX_RESULTS", 200))
+GLOB_TIME_BUDGET = float(os.environ.get("SHINY_SHELL_GLOB_TIME_BUDGET", 0.5))
+
+# Subcommands and flags parsed from `cmd --help` are cached here, keyed by the
+# binary's path and mtime, so each help text is only parsed once
+HELP_CACHE_DIR = os.environ.get(
+    "SHINY_SHELL_HELP_CACHE_DIR",
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "shiny-shell", "help"
+    ),
+)
+HELP_TIMEOUT = float(os.environ.get("SHINY_SHELL_HELP_TIMEOUT", 3))
+# Only these commands, found on PATH, are ever run with --help; anything else
+# could do real work when handed a flag it doesn't understand
+HELP_COMMANDS = frozenset(
+    os.environ.get(
+        "SHINY_SHELL_HELP_COMMANDS",
+        "apt,brew,cargo,conda,cp,curl,docker,gh,git,go,grep,gzip,helm,kubectl,ls,"
+        "make,mkdir,mv,node,npm,pip,pip3,poetry,python,python3,rg,rm,rustup,sed,"
+        "ssh,systemctl,tar,terraform,uv,wget,yarn",
+    ).split(",")
+)
+
+# Commands in a `parallel:` block run on this many shared worker threads
+BATCH_MAX_WORKERS = int(os.environ.get("SHINY_SHELL_BATCH_WORKERS", 4))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix="shiny-shell-batch")
+
+# Every session is recorded as an asciicast v2 file here (set to "" to turn
+# recording off); events are buffered in memory and written in batches
+RECORDING_DIR = os.environ.get(
+    "SHINY_SHELL_RECORDING_DIR",
+    os.path.join(
+        os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share")),
+        "shiny-shell",
+        "recordings",
+    ),
+)
+RECORDING_COMPRESS = os.environ.get("SHINY_SHELL_RECORDING_COMPRESS", "").lower() in ("1", "true", "yes")
+RECORDING_BUFFER_BYTES = 64 * 1024
+RECORDING_FLUSH_INTERVAL = 5
+# Distance between seek points in the recording's .idx sidecar
+RECORDING_CHECKPOINT_BYTES = 256 * 1024
+
+# Chunks of a shared session kept for viewers who join late or fall behind
+BROADCAST_BACKLOG = int(os.environ.get("SHINY_SHELL_BROADCAST_BACKLOG", 500))
+
+# `download` streams files in chunks of this size; `upload` sends them in
+# chunks of this size over the session's websocket
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_CHUNK_BYTES = 512 * 1024
+
+# Most results a scrollback search returns
+SEARCH_MAX_RESULTS = 50
+# Scrollback is indexed for search on one background thread, in order
+index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shiny-shell-index")
+
+# Running totals across all sessions, logged each time a session is reaped
+reaper_stats = {
+    "sessions_reaped": 0,
+    "entries_spilled": 0,
+    "bytes_reclaimed": 0,
+    "processes_killed": 0,
+}
+
+
+def process_group_alive(pgid):
+    try:
+        os.killpg(pgid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def prune_process_groups(pgids):
+    """
+    Drop groups that have exited from pgids. Once a group is gone its ID can
+    be reused by an unrelated process, so it must not be signalled later.
+    """
+    pgids.difference_update([pgid for pgid in list(pgids) if not process_group_alive(pgid)])
+
+
+def kill_process_groups(pgids, reap=None):
+    """
+    SIGTERM every process group in pgids that is still alive, then SIGKILL
+    any that outlive KILL_GRACE_PERIOD. Groups that are gone are removed from
+    pgids; returns how many were killed. reap, if given, is called while
+    waiting so a direct child's exit can be collected.
+    """
+    targets = {pgid for pgid in list(pgids) if process_group_alive(pgid)}
+    pgids.intersection_update(targets)
+
+    remaining = set(targets)
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        for pgid in list(remaining):
+            try:
+                os.killpg(pgid, sig)
+            except ProcessLookupError:
+                remaining.discard(pgid)
+            except PermissionError:
+                pass
+        deadline = time.monotonic() + KILL_GRACE_PERIOD
+        while remaining and time.monotonic() < deadline:
+            if reap is not None:
+                reap()
+            remaining = {pgid for pgid in remaining if process_group_alive(pgid)}
+            if remaining:
+                time.sleep(0.05)
+        if not remaining:
+            break
+
+    killed = targets - remaining
+    pgids.difference_update(killed)
+    return len(killed)
+
+
+def make_private_dir(path):
+    """
+    Create path with access for this user only, or check that an existing
+    one belongs to this user and tighten its mode. Raises OSError if it is
+    not a directory this user owns.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        raise PermissionError(f"{path} is not a directory owned by this user")
+    if stat.S_IMODE(st.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+
+
+def spill_scrollback(path, entries, index):
+    """
+    Append entries to the spill file at path as JSON lines, and tell index
+    where each one went once they are all written. The file is readable by
+    this user only. Returns the number of bytes written.
+    """
+    make_private_dir(os.path.dirname(path))
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+    offsets = []
+    with open(fd, "ab") as f:
+        os.fchmod(fd, 0o600)
+        start = f.seek(0, os.SEEK_END)
+        for entry in entries:
+            line = (json.dumps(entry) + "\n").encode("utf-8")
+            if "id" in entry:
+                offsets.append((entry["id"], f.tell()))
+            f.write(line)
+        written = f.tell() - start
+    for entry_id, offset in offsets:
+        index.spill(entry_id, path, offset)
+    return written
+
+
+def has_wildcards(word):
+    return any(c in word for c in "*?[")
+
+
+def expand_glob(pattern, directory, max_results=GLOB_MAX_RESULTS, time_budget=GLOB_TIME_BUDGET):
+    """
+    Expand a shell wildcard pattern relative to directory.
+
+    Supports `*`, `?`, `[...]` and `**` (any number of directories). The tree
+    is walked iteratively with os.scandir, and the walk stops once max_results
+    matches are found or time_budget seconds have passed. Returns the sorted
+    matches and whether the walk was complete.
+    """
+    deadline = time.monotonic() + time_budget
+
+    # Matches keep the form the user typed: absolute, ~/ or relative
+    if pattern.startswith("/"):
+        root, display_root = "/", "/"
+    elif pattern.startswith("~/"):
+        root, display_root = os.environ.get("HOME", directory), "~/"
+        pattern = pattern[2:]
+    else:
+        root, display_root = directory, ""
+    parts = [part for part in pattern.split("/") if part]
+    dirs_only = pattern.endswith("/")
+
+    matches = set()
+    # Stack of (filesystem path, display path, index of next pattern part)
+    stack = [(root, display_root, 0)]
+    while stack:
+        if len(matches) >= max_results or time.monotonic() > deadline:
+            return sorted(matches)[:max_results], False
+
+        path, display, index = stack.pop()
+        if index == len(parts):
+            if display and display != display_root:
+                matches.add(display.rstrip("/") + ("/" if dirs_only else ""))
+            continue
+
+        part = parts[index]
+        is_last = index == len(parts) - 1
+
+        if not has_wildcards(part):
+            child = os.path.join(path, part)
+            if os.path.isdir(child) or (is_last and os.path.exists(child) and not dirs_only):
+                stack.append((child, f"{display}{part}/", index + 1))
+            continue
+
+        try:
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda entry: entry.name, reverse=True)
+        except (PermissionError, OSError):
+            continue
+
+        if part == "**":
+            # Zero directories, then recurse into each subdirectory with the
+            # same pattern part
+            stack.append((path, display, index + 1))
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir:
+                    stack.append((entry.path, f"{display}{entry.name}/", index))
+                elif is_last and not dirs_only:
+                    matches.add(f"{display}{entry.name}")
+            continue
+
+        for entry in entries:
+            # Like the shell, wildcards only match dotfiles when asked to
+            if entry.name.startswith(".") and not part.startswith("."):
+                continue
+            if not fnmatch.fnmatchcase(entry.name, part):
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                stack.append((entry.path, f"{display}{entry.name}/", index + 1))
+            elif is_last and not dirs_only:
+                matches.add(f"{display}{entry.name}")
+
+    # The walk finished, but a single directory can add more than
+    # max_results at once
+    return sorted(matches)[:max_results], len(matches) <= max_results
+
+
+def run_shell_command(cmd, cwd, child_pgids):
+    """
+    Run cmd through the shell in cwd and return its result dict.
+
+    The command gets its own process group, recorded in child_pgids while
+    anything in it is still running, so background jobs it leaves behind can
+    be reaped. Safe to call from worker threads.
+    """
+    started = time.monotonic()
+    prune_process_groups(child_pgids)
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            cwd=cwd,
+            start_new_session=True,
+        )
+        child_pgids.add(proc.pid)
+        try:
+            stdout, stderr = proc.communicate(timeout=30)
+        except subprocess.TimeoutExpired:
+            kill_process_groups({proc.pid}, reap=proc.poll)
+            try:
+                proc.communicate(timeout=KILL_GRACE_PERIOD)
+            except subprocess.TimeoutExpired:
+                # Something outside the group still holds the pipes open;
+                # give up on the rest of the output
+                proc.kill()
+                proc.stdout.close()
+                proc.stderr.close()
+                proc.wait()
+            raise
+        finally:
+            if not process_group_alive(proc.pid):
+                child_pgids.discard(proc.pid)
+
+        output_text = ""
+        if stdout:
+            output_text += stdout
+        if stderr:
+            output_text += stderr
+
+        result = {
+            "command": cmd,
+            "output": output_text,
+            "return_code": proc.returncode,
+            "success": proc.returncode == 0,
+        }
+    except subprocess.TimeoutExpired:
+        result = {
+            "command": cmd,
+            "output": "Command timed out (30s limit)",
+            "return_code": -1,
+            "success": False,
+        }
+    except Exception as e:
+        result = {
+            "command": cmd,
+            "output": f"Error: {str(e)}",
+            "return_code": -1,
+            "success": False,
+        }
+    result["elapsed"] = time.monotonic() - started
+    return result
+
+
+def parse_batch_script(script):
+    """
+    Split a pasted script into steps that run one after another.
+
+    Each line is its own step, except that the indented lines following a
+    `parallel:` line form a single step whose commands run concurrently.
+    Blank lines and comments are skipped.
+    """
+    steps = []
+    parallel = None
+    for line in script.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if parallel is not None and line[0].isspace():
+            parallel.append(stripped)
+            continue
+        parallel = None
+        if stripped == "parallel:":
+            parallel = []
+            steps.append(parallel)
+        else:
+            steps.append([stripped])
+    return [step for step in steps if step]
+
+
+def format_batch_summary(results, elapsed):
+    failed = sum(1 for result in results if not result["success"])
+    lines = [
+        f"batch: {len(results)} commands in {elapsed:.2f}s "
+        f"({len(results) - failed} succeeded, {failed} failed)",
+        f"{'exit':>6}  {'time':>8}  command",
+    ]
+    for result in results:
+        lines.append(f"{result['return_code']:>6}  {result['elapsed']:>7.2f}s  {result['command']}")
+    return "\n".join(lines)
+
+
+class SessionRecorder:
+    """
+    Append-only asciicast v2 recording of a session.
+
+    Events are buffered and written once RECORDING_BUFFER_BYTES have built up
+    or flush() is called, so recording costs a list append per command. Every
+    RECORDING_CHECKPOINT_BYTES a seek point (time, byte offset) is appended
+    to a .idx sidecar; compressed recordings start a new gzip member at each
+    seek point so a reader can start decompressing there. If writing fails
+    (a full disk, say), recording stops for the session instead of failing it.
+    """
+
+    def __init__(self, path, compress=False, width=120, height=40):
+        self.path = path
+        self.compress = compress
+        self.started = time.monotonic()
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.since_checkpoint = 0
+        self.error = None
+
+        self.raw = open(path, "ab")
+        self.index = open(f"{path}.idx", "a", encoding="utf-8")
+        self.writer = None
+        header = {
+            "version": 2,
+            "width": width,
+            "height": height,
+            "timestamp": int(time.time()),
+            "env": {"SHELL": os.environ.get("SHELL", "/bin/sh"), "TERM": "xterm-256color"},
+        }
+        self._write(json.dumps(header) + "\n")
+        self._checkpoint(0.0)
+
+    def _write(self, line):
+        if self.writer is None:
+            self.writer = gzip.GzipFile(fileobj=self.raw, mode="ab") if self.compress else self.raw
+        self.writer.write(line.encode("utf-8"))
+
+    def _checkpoint(self, elapsed):
+        if self.compress and self.writer is not None:
+            # Finish this gzip member so the next one can be read on its own
+            self.writer.close()
+            self.writer = None
+        self.index.write(json.dumps([round(elapsed, 6), self.raw.tell()]) + "\n")
+        self.since_checkpoint = 0
+
+    def _stop(self, error):
+        print(f"Recording to {self.path} stopped: {error}")  # Debug
+        self.error = error
+        self.buffer = []
+        self.buffered_bytes = 0
+        for f in (self.writer, self.raw, self.index):
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+
+    def event(self, code, data):
+        if self.error is not None:
+            return
+        elapsed = time.monotonic() - self.started
+        line = json.dumps([round(elapsed, 6), code, data]) + "\n"
+        self.buffer.append((elapsed, line))
+        self.buffered_bytes += len(line)
+        if self.buffered_bytes >= RECORDING_BUFFER_BYTES:
+            self.flush()
+
+    def record_command(self, prompt, cmd, output):
+        self.event("i", cmd + "\r")
+        self.event("o", f"{prompt}{cmd}\r\n")
+        if output:
+            if not output.endswith("\n"):
+                output += "\n"
+            self.event("o", output.replace("\r\n", "\n").replace("\n", "\r\n"))
+
+    def flush(self):
+        if self.error is not None or not self.buffer:
+            return
+        try:
+            for elapsed, line in self.buffer:
+                if self.since_checkpoint >= RECORDING_CHECKPOINT_BYTES:
+                    self._checkpoint(elapsed)
+                self._write(line)
+                self.since_checkpoint += len(line)
+            self.buffer = []
+            self.buffered_bytes = 0
+            if self.compress:
+                self.writer.flush()
+            self.raw.flush()
+            self.index.flush()
+        except OSError as e:
+            self._stop(e)
+
+    def close(self):
+        self.flush()
+        if self.error is not None:
+            return
+        try:
+            if self.compress and self.writer is not None:
+                self.writer.close()
+            self.raw.close()
+            self.index.close()
+        except OSError as e:
+            self._stop(e)
+
+
+def read_recording(path, start=0.0, limit=200):
+    """
+    Read up to limit events at or after start seconds from a recording.
+
+    Jumps to the nearest seek point in the .idx sidecar instead of reading
+    from the beginning. Events before start are skipped by their timestamp
+    alone, so only the events returned are decoded. Returns the header, the
+    events, and the time of the next event (None at the end).
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+
+    seek_times, seek_offsets = [0.0], [0]
+    try:
+        with open(f"{path}.idx", encoding="utf-8") as f:
+            for line in f:
+                t, offset = json.loads(line)
+                seek_times.append(t)
+                seek_offsets.append(offset)
+    except (OSError, ValueError):
+        pass
+    offset = seek_offsets[bisect.bisect_right(seek_times, start) - 1]
+
+    events = []
+    next_time = None
+    with open(path, "rb") as raw:
+        raw.seek(offset)
+        stream = gzip.GzipFile(fileobj=raw) if path.endswith(".gz") else raw
+        try:
+            for line in stream:
+                if not line.startswith(b"["):
+                    # The header
+                    continue
+                if float(line[1:line.index(b",")]) < start:
+                    continue
+                event = json.loads(line)
+                if len(events) >= limit:
+                    next_time = event[0]
+                    break
+                events.append(event)
+        except EOFError:
+            # A recording still being written ends partway through a gzip
+            # member; everything flushed so far has been read
+            pass
+    return header, events, next_time
+
+
+def parse_timestamp(text):
+    # Seconds, or [[h:]m:]s
+    seconds = 0.0
+    for part in text.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def format_timestamp(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours}:{minutes:02d}:{seconds:06.3f}"
+
+
+def render_entry(entry):
+    # Elements for one terminal session entry: prompt + command, then output
+    elements = []
+    if entry["prompt"] or entry["command"]:
+        elements.append(
+            ui.div(f"{entry['prompt']}{entry['command']}", class_="terminal-output")
+        )
+    if entry["output"]:
+        output_class = "success-output" if entry["success"] else "error-output"
+        elements.append(
+            ui.div(entry["output"], class_=f"terminal-output {output_class}")
+        )
+    return elements
+
+
+class BroadcastChannel:
+    """
+    A shared session's output, fanned out to any number of read-only viewers.
+
+    The producer encodes each entry to HTML once and publishes it. Every
+    viewer's queue gets the same chunk object, and one writer task per viewer
+    sends chunks in order. An extra viewer therefore costs a websocket write,
+    not a re-render or a copy of the scrollback. Late joiners, and viewers
+    that fall more than BROADCAST_BACKLOG chunks behind, are sent the shared
+    backlog in one message.
+    """
+
+    def __init__(self, token):
+        self.token = token
+        self.chunks = collections.deque(maxlen=BROADCAST_BACKLOG)
+        self.viewers = {}  # viewer session id -> (queue, writer task)
+
+    def _snapshot(self):
+        return {"html": "".join(chunk["html"] for chunk in self.chunks), "reset": True}
+
+    def publish(self, html):
+        chunk = {"html": html}
+        self.chunks.append(chunk)
+        for queue, _ in self.viewers.values():
+            if queue.qsize() >= BROADCAST_BACKLOG:
+                # Too far behind; skip ahead to the backlog instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._snapshot())
+            else:
+                queue.put_nowait(chunk)
+
+    def subscribe(self, viewer):
+        self.unsubscribe(viewer.id)
+        queue = asyncio.Queue()
+        queue.put_nowait(self._snapshot())
+        task = asyncio.create_task(self._send_chunks(viewer, queue))
+        self.viewers[viewer.id] = (queue, task)
+
+    def unsubscribe(self, viewer_id, html=None):
+        # With html, the viewer is sent it as a last chunk; otherwise (the
+        # viewer is gone) its writer task is just cancelled
+        queue_and_task = self.viewers.pop(viewer_id, None)
+        if queue_and_task is None:
+            return
+        queue, task = queue_and_task
+        if html is None:
+            task.cancel()
+        else:
+            queue.put_nowait({"html": html, "closed": True})
+
+    def close(self, html):
+        # Writer tasks stop after sending the closing chunk
+        chunk = {"html": html, "closed": True}
+        for queue, _ in self.viewers.values():
+            queue.put_nowait(chunk)
+        broadcast_channels.pop(self.token, None)
+
+    async def _send_chunks(self, viewer, queue):
+        while True:
+            chunk = await queue.get()
+            try:
+                await viewer.send_custom_message("broadcast_chunk", chunk)
+            except Exception as e:
+                print(f"Dropping viewer {viewer.id} of {self.token}: {e}")  # Debug
+                chunk = {"closed": True}
+            if chunk.get("closed"):
+                if viewer.id in self.viewers and self.viewers[viewer.id][0] is queue:
+                    del self.viewers[viewer.id]
+                return
+
+
+# Shared sessions by share token
+broadcast_channels = {}
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            break
+        size /= 1024
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+
+
+def unused_path(path):
+    # path, or "name (1).ext", "name (2).ext", ... if that is taken
+    root, ext = os.path.splitext(path)
+    candidate, n = path, 1
+    while os.path.lexists(candidate):
+        candidate = f"{root} ({n}){ext}"
+        n += 1
+    return candidate
+
+
+def parse_range(range_header, size):
+    """
+    Parse a single-range `Range: bytes=...` header.
+
+    Returns (start, end) inclusive, None if the header should be ignored and
+    the whole file sent, or False if the range can't be satisfied.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+    else:
+        # bytes=-N is the last N bytes
+        start = max(0, size - int(match.group(2)))
+        end = size - 1
+    end = min(end, size - 1)
+    if start > end:
+        return False
+    return start, end
+
+
+def iter_file_range(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(DOWNLOAD_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_download_response(request, path):
+    """
+    Stream path to the browser, honoring Range requests so that interrupted
+    downloads can resume. Memory use is one chunk regardless of file size.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return PlainTextResponse("File not found", 404)
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(os.path.basename(path))}",
+    }
+
+    start, end, status = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    # If-Range means "only resume if the file hasn't changed"
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = parse_range(range_header, size)
+        if byte_range is False:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(max(0, end - start + 1))
+    return StreamingResponse(
+        iter_file_range(path, start, end),
+        status_code=status,
+        headers=headers,
+        media_type="application/octet-stream",
+    )
+
+
+def entry_text(entry):
+    return f"{entry['command']}\n{entry['output']}"
+
+
+def regex_literals(pattern):
+    """
+    Literal runs every match of a regex must contain, for narrowing a search
+    with the trigram index. Conservative: returns [] (no narrowing) for
+    alternations and anything it doesn't understand.
+    """
+    if "|" in pattern or "(?" in pattern:
+        # Lookarounds, inline flags and the like aren't plain groups
+        return []
+    literals = []
+    current = ""
+    groups = []  # index into literals where each open group started
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            escaped = pattern[i + 1]
+            if escaped.isalnum():
+                # \d, \w, \b and friends aren't literals
+                literals.append(current)
+                current = ""
+            else:
+                current += escaped
+            i += 2
+            continue
+        if c in "*?{":
+            # The previous character is optional or repeated
+            current = current[:-1]
+            literals.append(current)
+            current = ""
+            if c == "{":
+                close = pattern.find("}", i + 1)
+                if close != -1:
+                    i = close
+        elif c == "+":
+            literals.append(current)
+            current = ""
+        elif c in ".^$()[]":
+            literals.append(current)
+            current = ""
+            if c == "(":
+                groups.append(len(literals))
+            elif c == ")":
+                if not groups:
+                    return []
+                start = groups.pop()
+                if pattern[i + 1:i + 2] in ("?", "*", "{"):
+                    # The whole group is optional or repeated
+                    del literals[start:]
+            elif c == "[":
+                # Find the end of the class; a leading ] and escaped
+                # characters don't close it
+                i += 1
+                if pattern[i:i + 1] == "^":
+                    i += 1
+                if pattern[i:i + 1] == "]":
+                    i += 1
+                while i < len(pattern) and pattern[i] != "]":
+                    i += 2 if pattern[i] == "\\" else 1
+                if i >= len(pattern):
+                    return []
+        else:
+            current += c
+        i += 1
+    literals.append(current)
+    return [literal for literal in literals if len(literal) >= 3]
+
+
+def trigrams(text):
+    return set(zip(text, text[1:], text[2:]))
+
+
+class ScrollbackIndex:
+    """
+    Incrementally maintained trigram index over a session's scrollback.
+
+    Each entry's command and output are indexed once, on index_executor, by
+    the lowercase trigrams they contain, so a command with huge output
+    doesn't hold up the session. A search intersects the posting lists for
+    the query's trigrams, adds any entries not indexed yet, and checks only
+    those candidates with the real pattern. In-memory entries are referenced
+    rather than copied; after the reaper spills them, the index keeps their
+    offsets in the spill file instead.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = {}  # trigram -> array of entry ids, ascending
+        self.entries = {}  # entry id -> entry dict still in memory
+        self.spilled = {}  # entry id -> (spill path, byte offset)
+        self.unindexed = set()
+
+    def add(self, entry_id, entry):
+        with self.lock:
+            self.entries[entry_id] = entry
+            self.unindexed.add(entry_id)
+        index_executor.submit(self._index, entry_id, entry)
+
+    def _index(self, entry_id, entry):
+        entry_trigrams = trigrams(entry_text(entry).lower())
+        with self.lock:
+            for trigram in entry_trigrams:
+                ids = self.postings.get(trigram)
+                if ids is None:
+                    self.postings[trigram] = array("L", [entry_id])
+                elif ids[-1] != entry_id:
+                    ids.append(entry_id)
+            self.unindexed.discard(entry_id)
+
+    def spill(self, entry_id, path, offset):
+        with self.lock:
+            if self.entries.pop(entry_id, None) is not None:
+                self.spilled[entry_id] = (path, offset)
+
+    def _candidates(self, literals):
+        query_trigrams = set()
+        for literal in literals:
+            query_trigrams |= trigrams(literal.lower())
+
+        with self.lock:
+            if not query_trigrams:
+                return sorted(self.entries.keys() | self.spilled.keys())
+
+            postings = sorted((self.postings.get(trigram, ()) for trigram in query_trigrams), key=len)
+            candidates = set(postings[0])
+            for ids in postings[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(ids)
+            return sorted(candidates | self.unindexed)
+
+    def search(self, pattern, regex=False, case_sensitive=False, limit=SEARCH_MAX_RESULTS):
+        """
+        Find entries matching pattern, newest first.
+
+        Returns a list of (entry id, entry, match, spilled) for up to limit
+        entries, and whether there were more.
+        """
+        flags = 0 if case_sensitive else re.IGNORECASE
+        compiled = re.compile(pattern if regex else re.escape(pattern), flags)
+        literals = regex_literals(pattern) if regex else [pattern]
+
+        results = []
+        spill_files = {}
+        try:
+            for entry_id in reversed(self._candidates(literals)):
+                entry = self.entries.get(entry_id)
+                if entry is not None:
+                    spilled = False
+                else:
+                    path, offset = self.spilled[entry_id]
+                    if path not in spill_files:
+                        spill_files[path] = open(path, encoding="utf-8")
+                    spill_files[path].seek(offset)
+                    entry, spilled = json.loads(spill_files[path].readline()), True
+
+                match = compiled.search(entry_text(entry))
+                if match is None:
+                    continue
+                if len(results) == limit:
+                    return results, True
+                results.append((entry_id, entry, match, spilled))
+        finally:
+            for f in spill_files.values():
+                f.close()
+        return results, False
+
+
+def highlight_match(text, match, context=60):
+    # The line around a match, with the match wrapped in <mark>
+    line_start = text.rfind("\n", 0, match.start()) + 1
+    line_end = text.find("\n", match.end())
+    if line_end == -1:
+        line_end = len(text)
+    start = max(line_start, match.start() - context)
+    end = min(line_end, match.end() + context)
+    return [
+        "…" if start > line_start else "",
+        text[start:match.start()],
+        ui.tags.mark(match.group(0)),
+        text[match.end():end],
+        "…" if end < line_end else "",
+    ]
+
+
+# Operators the tokenizer recognizes, and which of them take a filename
+SHELL_OPERATORS = {
+    "|", "||", "&", "&&", ";", ";;", "(", ")",
+    "<", ">", ">>", "<<", "<<<", "<&", ">&", "&>", "&>>", ">|",
+}
+REDIRECT_OPERATORS = {"<", ">", ">>", "<&", ">&", "&>", "&>>", ">|"}
+OPERATOR_CHARS = "|&;()<>"
+
+# Characters that don't need escaping in an unquoted completion
+SAFE_UNQUOTED = re.compile(r"[\w@%+=:,./~-]")
+
+
+class CommandLineTokenizer:
+    """
+    Single-pass, resumable tokenizer for a shell command line.
+
+    Tracks single and double quotes and backslash escapes, and splits words on
+    unquoted whitespace and shell operators. Tokens are dicts with the raw
+    start/end offsets, the unquoted value, whether the token is an operator,
+    and the quote character still open at the end of the text (if any).
+    Feeding text that extends what was fed before only scans the new
+    characters, so repeated Tabs on a growing line don't re-parse it.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.text = ""
+        self.tokens = []  # Finished tokens
+        self.current = None  # Token still being scanned
+        self.quote = None
+        self.escape = False
+
+    def feed(self, text):
+        if not text.startswith(self.text):
+            self.reset()
+        for i in range(len(self.text), len(text)):
+            self._scan(text, i)
+        self.text = text
+        return self
+
+    def _start(self, pos, operator=False):
+        self.current = {"start": pos, "end": pos, "value": "", "operator": operator, "quote": None}
+
+    def _finish(self):
+        if self.current is not None:
+            self.tokens.append(self.current)
+            self.current = None
+
+    def _scan(self, text, pos):
+        c = text[pos]
+        token = self.current
+
+        if self.escape:
+            self.escape = False
+            if self.quote == '"' and c not in '$`"\\\n':
+                token["value"] += "\\"
+            if c != "\n":
+                token["value"] += c
+        elif self.quote == "'":
+            if c == "'":
+                self.quote = None
+            else:
+                token["value"] += c
+        elif self.quote == '"':
+            if c == '"':
+                self.quote = None
+            elif c == "\\":
+                self.escape = True
+            else:
+                token["value"] += c
+        elif c.isspace():
+            self._finish()
+        elif c in OPERATOR_CHARS:
+            if token is not None and token["operator"] and token["value"] + c in SHELL_OPERATORS:
+                token["value"] += c
+            elif (
+                token is not None
+                and not token["operator"]
+                and c in "<>"
+                and text[token["start"]:pos].isdigit()
+            ):
+                # File descriptor redirection like 2> is one operator, but a
+                # quoted '2'> is an argument and a redirection
+                token["operator"] = True
+                token["value"] = c
+            else:
+                self._finish()
+                self._start(pos, operator=True)
+                self.current["value"] = c
+        else:
+            if token is None or token["operator"]:
+                self._finish()
+                self._start(pos)
+            if c == "\\":
+                self.escape = True
+            elif c in "'\"":
+                self.quote = c
+            else:
+                self.current["value"] += c
+
+        if self.current is not None:
+            self.current["end"] = pos + 1
+            self.current["quote"] = self.quote
+
+    def word_end(self, command, pos):
+        """Find where the word at pos ends, continuing the current quoting state."""
+        quote = self.quote
+        escape = self.escape
+        while pos < len(command):
+            c = command[pos]
+            if escape:
+                escape = False
+            elif quote:
+                if c == quote:
+                    quote = None
+                elif c == "\\" and quote == '"':
+                    escape = True
+            elif c.isspace() or c in OPERATOR_CHARS:
+                break
+            elif c == "\\":
+                escape = True
+            elif c in "'\"":
+                quote = c
+            pos += 1
+        return pos
+
+
+def get_completion_context(tokenizer, command, cursor_pos):
+    """
+    Work out what the word at the cursor is and which completer should run.
+
+    Returns a dict with the kind of word ("command", "path", "env" or
+    "redirect"), its unquoted text up to the cursor, the raw start/end offsets
+    to replace, the open quote character (if any), and the earlier words of
+    the same simple command.
+    """
+    tokenizer.feed(command[:cursor_pos])
+    tokens = tokenizer.tokens
+    current = tokenizer.current
+    if current is not None and current["operator"]:
+        # Cursor is right after an operator like `>`; complete a new word
+        tokens = tokens + [current]
+        current = None
+
+    # Earlier words of this simple command
+    words_before = []
+    previous_operator = None
+    for token in tokens:
+        if token["operator"]:
+            if token["value"] in REDIRECT_OPERATORS:
+                previous_operator = token["value"]
+            else:
+                words_before = []
+                previous_operator = None
+        elif previous_operator is not None:
+            # This was a redirection target, not a word of the command
+            previous_operator = None
+        else:
+            words_before.append(token["value"])
+    if tokens and tokens[-1]["operator"]:
+        previous_operator = tokens[-1]["value"]
+    else:
+        previous_operator = None
+
+    if current is None:
+        word, start, quote = "", cursor_pos, None
+    else:
+        word, start, quote = current["value"], current["start"], current["quote"]
+    end = tokenizer.word_end(command, cursor_pos)
+
+    # Leading VAR=value assignments don't count as the command
+    command_words = [w for w in words_before if not re.match(r"^[A-Za-z_][A-Za-z0-9_]*=", w)]
+
+    dollar = word.rfind("$")
+    if quote != "'" and dollar != -1 and re.fullmatch(r"\{?[A-Za-z0-9_]*", word[dollar + 1:]):
+        kind = "env"
+        # Only the $NAME part is replaced
+        raw_dollar = command.rfind("$", start, cursor_pos)
+        start, end = raw_dollar, cursor_pos
+        word = word[dollar:]
+        quote = None
+    elif previous_operator in REDIRECT_OPERATORS:
+        kind = "redirect"
+    elif not command_words and "/" not in word:
+        kind = "command"
+    else:
+        kind = "path"
+
+    return {
+        "kind": kind,
+        "word": word,
+        "start": start,
+        "end": end,
+        "quote": quote,
+        "words_before": command_words,
+    }
+
+
+def command_args(cmd):
+    """The arguments of a built-in command, unquoted the way the shell would."""
+    tokenizer = CommandLineTokenizer().feed(cmd)
+    tokens = tokenizer.tokens + ([tokenizer.current] if tokenizer.current is not None else [])
+    return [token["value"] for token in tokens if not token["operator"]][1:]
+
+
+def quote_completion(value, quote=None, closed=True):
+    """
+    Quote a completion the way the word being completed was quoted.
+
+    Inside single or double quotes the completion reopens the same quote and
+    closes it again unless closed is False (e.g. for a directory, so completion
+    can continue into it). Unquoted completions escape special characters
+    with backslashes.
+    """
+    if quote == "'":
+        return "'" + value.replace("'", "'\\''") + ("'" if closed else "")
+    if quote == '"':
+        return '"' + re.sub(r'(["$`\\])', r"\\\1", value) + ('"' if closed else "")
+    return "".join(c if SAFE_UNQUOTED.match(c) else "\\" + c for c in value)
+
+
+def get_command_completions(prefix):
+    # Get commands from PATH
+    commands = set()
+    path_dirs = os.environ.get("PATH", "").split(os.pathsep)
+
+    for path_dir in path_dirs:
+        if os.path.isdir(path_dir):
+            try:
+                for cmd in os.listdir(path_dir):
+                    cmd_path = os.path.join(path_dir, cmd)
+                    if os.path.isfile(cmd_path) and os.access(cmd_path, os.X_OK):
+                        if cmd.startswith(prefix):
+                            commands.add(cmd)
+            except (PermissionError, OSError):
+                continue
+
+    # Add some common built-in commands
+    builtins = [
+        "cd", "pwd", "echo", "export", "set", "unset", "history", "exit",
+        "recordings", "replay", "share", "unshare", "watch", "unwatch",
+        "upload", "download", "search",
+    ]
+    for builtin in builtins:
+        if builtin.startswith(prefix):
+            commands.add(builtin)
+
+    return sorted(list(commands))
+
+def get_file_completions(prefix, directory):
+    completions = []
+
+    print(f"get_file_completions: prefix='{prefix}', directory='{directory}'")  # Debug
+
+    # Handle paths with directory separators
+    if "/" in prefix:
+        dir_part = os.path.dirname(prefix)
+        file_part = os.path.basename(prefix)
+
+        print(f"Path with '/': dir_part='{dir_part}', file_part='{file_part}'")  # Debug
+
+        # Handle absolute vs relative paths
+        if prefix.startswith("/"):
+            search_dir = dir_part if dir_part else "/"
+            is_absolute = True
+        else:
+            search_dir = os.path.join(directory, dir_part) if dir_part else directory
+            is_absolute = False
+    else:
+        search_dir = directory
+        file_part = prefix
+        is_absolute = False
+        dir_part = ""
+
+    print(f"Searching in: '{search_dir}' for files starting with '{file_part}'")  # Debug
+
+    try:
+        if os.path.isdir(search_dir):
+            for item in os.listdir(search_dir):
+                if item.startswith(file_part):
+                    item_path = os.path.join(search_dir, item)
+
+                    # Build the completion with proper path prefix
+                    if dir_part:
+                        if is_absolute:
+                            completion = os.path.join(dir_part, item)
+                        else:
+                            completion = os.path.join(dir_part, item)
+                    else:
+                        completion = item
+
+                    if os.path.isdir(item_path):
+                        completion += "/"
+
+                    completions.append(completion)
+                    print(f"Added completion: '{completion}'")  # Debug
+    except (PermissionError, OSError) as e:
+        print(f"Error accessing directory: {e}")  # Debug
+
+    return sorted(completions)
+
+
+def get_env_completions(word):
+    # word is "$NAME" or "${NAME"
+    braced = word.startswith("${")
+    prefix = word[2:] if braced else word[1:]
+    names = sorted(name for name in os.environ if name.startswith(prefix))
+    if braced:
+        return ["${" + name + "}" for name in names]
+    return ["$" + name for name in names]
+
+
+def find_common_prefix(completions):
+    if not completions:
+        return ""
+
+    if len(completions) == 1:
+        return completions[0]
+
+    common = completions[0]
+    for completion in completions[1:]:
+        while common and not completion.startswith(common):
+            common = common[:-1]
+
+    return common
+
+
+HELP_FLAG = re.compile(r"(?:^|[\s,\[|(])(--?[A-Za-z0-9][A-Za-z0-9_-]*)")
+# An argument spec after a subcommand's name, like UNIT..., [PATTERN...] or <file>
+HELP_ARGUMENT = r"(?:[A-Z][A-Z0-9_|=.-]*|\[[^\]]*\]|<[^>]*>)(?:\.\.\.)?"
+HELP_SUBCOMMAND = re.compile(
+    rf"^ {{1,8}}([A-Za-z][\w.:-]*(?:, ?[A-Za-z][\w.:-]*)*)\*?(?: {HELP_ARGUMENT})* {{2,}}\S"
+)
+
+
+def parse_help_output(text):
+    """
+    Pull subcommands and flags out of a command's --help output.
+
+    Flags are any -x or --long-option words. Subcommands are the first words
+    of indented lines under a heading that mentions commands, like
+    "Commands:" or "These are common Git commands used in various
+    situations:".
+    """
+    subcommands = []
+    flags = []
+    in_commands = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+
+        if not line[0].isspace():
+            # Headings end in a colon; other unindented lines (like git's
+            # section labels) don't change which section we're in
+            if stripped.endswith(":"):
+                in_commands = "command" in stripped.lower()
+        elif in_commands and not stripped.startswith("-"):
+            match = HELP_SUBCOMMAND.match(line)
+            if match:
+                for name in match.group(1).split(","):
+                    name = name.strip()
+                    if name not in subcommands:
+                        subcommands.append(name)
+
+        for flag in HELP_FLAG.findall(line):
+            if flag not in flags:
+                flags.append(flag)
+
+    return {"subcommands": subcommands, "flags": sorted(flags)}
+
+
+class HelpCompletionCache:
+    """
+    Subcommand and flag completions for commands, parsed from their --help.
+
+    Help is only fetched for commands on PATH named in HELP_COMMANDS, at most
+    once per command (and subcommand path), in a subprocess with a minimal
+    environment, an empty working directory, no stdin and a timeout. Parsed
+    results are kept in memory and on disk, keyed by the command's path on
+    PATH and the mtime of the file it resolves to, so upgrading a tool
+    refreshes them. Symlinks aren't resolved: multicall binaries like
+    busybox choose what to do from the name they are run as.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.specs = {}
+
+    def _key(self, binary, args):
+        # binary is the PATH entry, so it includes the command name
+        try:
+            mtime = os.stat(binary).st_mtime_ns
+        except OSError:
+            return None
+        return hashlib.sha1("\0".join([binary, str(mtime), *args]).encode("utf-8")).hexdigest()
+
+    def _run_help(self, binary, args):
+        sandbox = tempfile.mkdtemp(prefix="shiny-shell-help-")
+        env = {
+            "PATH": os.environ.get("PATH", ""),
+            "HOME": sandbox,
+            "LANG": "C",
+            "TERM": "dumb",
+            "NO_COLOR": "1",
+            "PAGER": "cat",
+            "MANPAGER": "cat",
+            "GIT_PAGER": "cat",
+        }
+        try:
+            proc = subprocess.Popen(
+                [binary, *args, "--help"],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                errors="replace",
+                cwd=sandbox,
+                env=env,
+                start_new_session=True,
+            )
+        except OSError:
+            shutil.rmtree(sandbox, ignore_errors=True)
+            return {"subcommands": [], "flags": []}
+        try:
+            stdout, stderr = proc.communicate(timeout=HELP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            # Kill the whole group, not just the direct child
+            kill_process_groups({proc.pid}, reap=proc.poll)
+            proc.kill()
+            proc.stdout.close()
+            proc.stderr.close()
+            proc.wait()
+            return {"subcommands": [], "flags": []}
+        finally:
+            shutil.rmtree(sandbox, ignore_errors=True)
+        return parse_help_output(stdout + stderr)
+
+    def get(self, binary, args=()):
+        key = self._key(binary, args)
+        if key is None:
+            return {"subcommands": [], "flags": []}
+        if key in self.specs:
+            return self.specs[key]
+
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                spec = json.load(f)
+        except (OSError, ValueError):
+            print(f"Parsing help for {binary} {' '.join(args)}")  # Debug
+            spec = self._run_help(binary, list(args))
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(spec, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Error caching help for {binary}: {e}")  # Debug
+
+        self.specs[key] = spec
+        return spec
+
+    def lookup(self, words):
+        """
+        Find the spec for the deepest known subcommand in words.
+
+        Returns the spec and whether every word after the command was a
+        subcommand, i.e. whether another subcommand could come next.
+        """
+        command = words[0]
+        # Never run scripts given by path or commands outside HELP_COMMANDS
+        if "/" in command or command not in HELP_COMMANDS:
+            return {"subcommands": [], "flags": []}, False
+        binary = shutil.which(command)
+        if not binary or not os.access(binary, os.X_OK):
+            return {"subcommands": [], "flags": []}, False
+
+        args = []
+        spec = self.get(binary)
+        for word in words[1:]:
+            if word not in spec["subcommands"]:
+                return spec, False
+            args.append(word)
+            spec = self.get(binary, args)
+        return spec, True
+
+
+help_completions = HelpCompletionCache(HELP_CACHE_DIR)
+
 
 app_ui = ui.page_fillable(
     ui.tags.head(
@@ -98,12 +1519,32 @@ app_ui = ui.page_fillable(
                 color: #888;
                 font-size: 12px;
             }
+            .search-results {
+                position: sticky;
+                top: 0;
+                z-index: 1;
+                background-color: #000;
+                border-bottom: 1px solid #00ff00;
+                max-height: 30vh;
+                overflow-y: auto;
+                white-space: pre-wrap;
+            }
+            .search-result[data-entry] {
+                cursor: pointer;
+            }
+            mark, .search-target {
+                background-color: #00ff00;
+                color: #000;
+            }
         """
         )
     ),
     ui.div(
+        ui.output_ui("search_display"),
+        ui.div(id="broadcast-view"),
         ui.output_ui("terminal_display"),
         ui.output_ui("completions_display"),
+        ui.div(id="transfer-status", class_="timestamp"),
         class_="terminal-container"
     ),
     ui.tags.script(
@@ -114,14 +1555,25 @@ app_ui = ui.page_fillable(
 
             // Handle keydown events on the input (using event delegation)
             $(document).on('keydown', '#command', function(e) {
-                if (e.key === 'Enter') {
+                if (e.key === 'f' && (e.ctrlKey || e.metaKey)) {
+                    // Search the scrollback on the server instead of the DOM
+                    e.preventDefault();
+                    $(this).val('search ');
+                } else if (e.key === 'Enter') {
                     e.preventDefault();
                     var cmd = $(this).val().trim();
+                    holdScroll = false;
 
                     // Clear completions when executing command
                     lastCompletionResult = null;
                     completionIndex = -1;
 
+                    if (cmd === 'upload' || cmd.indexOf('upload ') === 0) {
+                        // Open the file dialog now, while the keypress still
+                        // counts as a user gesture
+                        chooseUploadFiles(cmd);
+                    }
+
                     if (cmd) {
                         // Add to local history
                         commandHistory.push(cmd);
@@ -196,6 +1648,94 @@ app_ui = ui.page_fillable(
                 }
             });
 
+            // Pasting multiple lines submits them together as a batch
+            $(document).on('paste', '#command', function(e) {
+                var text = (e.originalEvent.clipboardData || window.clipboardData).getData('text');
+                if (text.indexOf('\n') === -1) {
+                    return;
+                }
+                e.preventDefault();
+
+                var cmd = $(this).val();
+                var script = cmd.substring(0, this.selectionStart) + text + cmd.substring(this.selectionEnd);
+                script.split('\n').forEach(function(line) {
+                    line = line.trim();
+                    if (line && line !== 'parallel:' && line.charAt(0) !== '#') {
+                        commandHistory.push(line);
+                    }
+                });
+                historyIndex = -1;
+                lastCompletionResult = null;
+                completionIndex = -1;
+
+                var requestData = JSON.stringify({
+                    script: script,
+                    timestamp: Date.now()
+                });
+                Shiny.setInputValue('execute_batch', requestData, {priority: 'event'});
+            });
+
+            // File transfers. Uploads are sent in chunks, each one waiting
+            // for the server to acknowledge the previous one
+            var uploadFiles = {};
+
+            function chooseUploadFiles(cmd) {
+                var picker = $('<input type="file" multiple style="display: none;">');
+                picker.on('change', function() {
+                    Array.prototype.forEach.call(this.files, function(file) {
+                        var id = file.name + '_' + file.size + '_' + file.lastModified;
+                        uploadFiles[id] = file;
+                        Shiny.setInputValue('upload_start', JSON.stringify({
+                            command: cmd,
+                            id: id,
+                            name: file.name,
+                            size: file.size,
+                            last_modified: file.lastModified,
+                            timestamp: Date.now()
+                        }), {priority: 'event'});
+                    });
+                    picker.remove();
+                });
+                $('body').append(picker);
+                picker[0].click();
+            }
+
+            Shiny.addCustomMessageHandler('upload_ack', function(ack) {
+                var file = uploadFiles[ack.id];
+                if (!file) {
+                    return;
+                }
+                if (ack.done || ack.error) {
+                    delete uploadFiles[ack.id];
+                    $('#transfer-status').text('');
+                    return;
+                }
+
+                var percent = file.size ? Math.floor(100 * ack.offset / file.size) : 100;
+                $('#transfer-status').text('upload ' + file.name + ': ' + percent + '%');
+
+                var reader = new FileReader();
+                reader.onload = function() {
+                    var data = reader.result.substring(reader.result.indexOf(',') + 1);
+                    Shiny.setInputValue('upload_chunk', JSON.stringify({
+                        id: ack.id,
+                        offset: ack.offset,
+                        data: data,
+                        timestamp: Date.now()
+                    }), {priority: 'event'});
+                };
+                reader.readAsDataURL(file.slice(ack.offset, ack.offset + ack.chunk_size));
+            });
+
+            Shiny.addCustomMessageHandler('start_download', function(message) {
+                var link = document.createElement('a');
+                link.href = message.url;
+                link.download = message.name;
+                document.body.appendChild(link);
+                link.click();
+                link.remove();
+            });
+
             // Keep input focused and auto-focus when page updates
             $(document).on('click', function(e) {
                 if (!$(e.target).is('#command')) {
@@ -212,10 +1752,15 @@ app_ui = ui.page_fillable(
                 }, 10);
             });
 
-            // Auto-scroll to bottom and focus input
+            // Auto-scroll to bottom and focus input, unless the view was
+            // moved to a search result
+            var holdScroll = false;
+
             function scrollToBottomAndFocus() {
                 var container = $('.terminal-container');
-                container.scrollTop(container[0].scrollHeight);
+                if (!holdScroll) {
+                    container.scrollTop(container[0].scrollHeight);
+                }
 
                 setTimeout(function() {
                     $('#command').focus();
@@ -278,6 +1823,39 @@ app_ui = ui.page_fillable(
                 }
             });
 
+            // Output of a shared session being watched
+            Shiny.addCustomMessageHandler('broadcast_chunk', function(chunk) {
+                var view = $('#broadcast-view');
+                if (chunk.reset) {
+                    view.html(chunk.html || '');
+                } else if (chunk.html) {
+                    view.append(chunk.html);
+                }
+            });
+
+            // Jump to a search result
+            function jumpToEntry(id) {
+                var target = document.getElementById(id);
+                if (!target) {
+                    return;
+                }
+                holdScroll = true;
+                $('.search-target').removeClass('search-target');
+                $(target).addClass('search-target');
+                target.scrollIntoView({block: 'center'});
+            }
+
+            Shiny.addCustomMessageHandler('search_jump', function(message) {
+                // Wait for the results panel to render first
+                setTimeout(function() {
+                    jumpToEntry('entry-' + message.entry);
+                }, 50);
+            });
+
+            $(document).on('click', '.search-result[data-entry]', function() {
+                jumpToEntry($(this).attr('data-entry'));
+            });
+
             // Track completions for cycling
             var currentCompletions = [];
             var completionIndex = -1;
@@ -306,6 +1884,54 @@ def server(input, output, session):
     history_index = reactive.value(-1)
     current_completions = reactive.value([])  # Store current tab completions
 
+    # Idle tracking for the reaper; plain variables so touching them doesn't
+    # trigger reactivity
+    last_activity = time.monotonic()
+    reaped = False
+    child_pgids = set()  # Process groups of commands that may still be running
+
+    # Reused across Tabs so a growing command line is only scanned once
+    completion_tokenizer = CommandLineTokenizer()
+
+    # Scrollback search: every entry gets an id, used for the index and as
+    # the anchor to jump to
+    scrollback_index = ScrollbackIndex()
+    next_entry_id = 0
+    search_results = reactive.value(None)
+
+    # Broadcast state: the channel this session shares, if any, and the
+    # token of the shared session it is watching, if any
+    sharing_channel = None
+    watching = reactive.value(None)
+
+    # File transfers: download tokens -> paths and in-progress uploads by id
+    downloads = {}
+    uploads = {}
+    # Next custom message for the browser, for code that can't await
+    client_message = reactive.value(None)
+
+    def serve_download(request):
+        path = downloads.get(request.query_params.get("token", ""))
+        if path is None:
+            return PlainTextResponse("Unknown download", 404)
+        print(f"Serving download {path} (range: {request.headers.get('range')})")  # Debug
+        return file_download_response(request, path)
+
+    download_url = session.dynamic_route("download", serve_download)
+
+    recorder = None
+    if RECORDING_DIR:
+        try:
+            os.makedirs(RECORDING_DIR, exist_ok=True)
+            recording_name = f"{time.strftime('%Y%m%d-%H%M%S')}-{session.id[:12]}.cast"
+            if RECORDING_COMPRESS:
+                recording_name += ".gz"
+            recorder = SessionRecorder(
+                os.path.join(RECORDING_DIR, recording_name), compress=RECORDING_COMPRESS
+            )
+        except OSError as e:
+            print(f"Error starting session recording: {e}")  # Debug
+
     # Get user and hostname for prompt
     username = os.environ.get("USER", "user")
     hostname = socket.gethostname()
@@ -318,214 +1944,428 @@ def server(input, output, session):
             cwd = cwd.replace(home, "~", 1)
         return f"{username}@{hostname}:{cwd}$ "
 
-    def get_tab_completions(command, cursor_pos):
-        try:
-            # Parse the command to find the word being completed
-            words = shlex.split(command[:cursor_pos])
-            if not words:
-                # Empty command, complete commands
-                return get_command_completions("")
-
-            # Check if cursor is at the end of a word or in whitespace
-            if cursor_pos > 0 and command[cursor_pos - 1].isspace():
-                # Completing a new word
-                if len(words) == 1:
-                    # Second word - likely a file/directory
-                    return get_file_completions("", current_dir.get())
-                else:
-                    # Subsequent words - file/directory completion
-                    return get_file_completions("", current_dir.get())
-            else:
-                # Completing current word
-                current_word = words[-1] if words else ""
+    async def get_tab_completions(command, cursor_pos):
+        # Work out what kind of word is under the cursor so the right
+        # completer runs the first time
+        context = get_completion_context(completion_tokenizer, command, cursor_pos)
+        kind = context["kind"]
+        word = context["word"]
+        quote = context["quote"]
+        raw_word = command[context["start"]:cursor_pos]
+        print(f"Completion context: {context}")  # Debug
 
-                if len(words) == 1:
-                    # First word - command completion
-                    return get_command_completions(current_word)
-                else:
-                    # File/directory completion
-                    return get_file_completions(current_word, current_dir.get())
-        except:
-            # If parsing fails, try file completion
-            return get_file_completions("", current_dir.get())
-
-    def get_command_completions(prefix):
-        # Get commands from PATH
-        commands = set()
-        path_dirs = os.environ.get("PATH", "").split(os.pathsep)
-
-        for path_dir in path_dirs:
-            if os.path.isdir(path_dir):
-                try:
-                    for cmd in os.listdir(path_dir):
-                        cmd_path = os.path.join(path_dir, cmd)
-                        if os.path.isfile(cmd_path) and os.access(cmd_path, os.X_OK):
-                            if cmd.startswith(prefix):
-                                commands.add(cmd)
-                except (PermissionError, OSError):
-                    continue
+        if kind == "env":
+            return get_env_completions(word), context
 
-        # Add some common built-in commands
-        builtins = ["cd", "pwd", "echo", "export", "set", "unset", "history", "exit"]
-        for builtin in builtins:
-            if builtin.startswith(prefix):
-                commands.add(builtin)
+        if quote is None and has_wildcards(raw_word):
+            # Unquoted wildcards - expand the word in place
+            return get_glob_completions(word, current_dir.get()), context
 
-        return sorted(list(commands))
+        if kind == "command":
+            completions = get_command_completions(word)
+            return [quote_completion(c, quote) for c in completions], context
 
-    def get_file_completions(prefix, directory):
         completions = []
+        if kind == "path" and context["words_before"]:
+            # Arguments - subcommands and flags from the command's --help,
+            # fetched off the event loop the first time
+            spec, at_subcommand = await asyncio.to_thread(
+                help_completions.lookup, context["words_before"]
+            )
+            if word.startswith("-"):
+                flags = [flag for flag in spec["flags"] if flag.startswith(word)]
+                return [quote_completion(flag, quote) for flag in flags], context
+            if at_subcommand:
+                completions += [sub for sub in spec["subcommands"] if sub.startswith(word)]
+
+        # Paths and redirection targets
+        completions += get_file_completions(word, current_dir.get())
+        return [quote_completion(c, quote, closed=not c.endswith("/")) for c in completions], context
+
+    def get_glob_completions(pattern, directory):
+        matches, complete = expand_glob(pattern, directory)
+        print(f"Glob '{pattern}' matched {len(matches)} paths (complete={complete})")  # Debug
+
+        if not complete:
+            # Too many matches to expand safely; list the first ones instead
+            current_completions.set(matches + [f"... (stopped after {len(matches)} matches)"])
+            return []
+
+        if not matches:
+            return []
+
+        # A single completion replaces the word, expanding it in place
+        return [" ".join(quote_completion(match) for match in matches)]
+
+    async def run_builtin(cmd):
+        # Run cmd if it is one of the shell's own commands, returning its
+        # result, or None if it should go to the system shell
+        # Handle cd command specially to update working directory
+        if cmd.strip().startswith("cd "):
+            path = cmd.strip()[3:].strip()
+            if not path:
+                path = os.environ.get("HOME", os.getcwd())
+            elif path == "~":
+                path = os.environ.get("HOME", os.getcwd())
+            elif path.startswith("~/"):
+                path = os.path.join(os.environ.get("HOME", os.getcwd()), path[2:])
 
-        print(f"get_file_completions: prefix='{prefix}', directory='{directory}'")  # Debug
-
-        # Handle paths with directory separators
-        if "/" in prefix:
-            dir_part = os.path.dirname(prefix)
-            file_part = os.path.basename(prefix)
-
-            print(f"Path with '/': dir_part='{dir_part}', file_part='{file_part}'")  # Debug
-
-            # Handle absolute vs relative paths
-            if prefix.startswith("/"):
-                search_dir = dir_part if dir_part else "/"
-                is_absolute = True
-            else:
-                search_dir = os.path.join(directory, dir_part) if dir_part else directory
-                is_absolute = False
-        else:
-            search_dir = directory
-            file_part = prefix
-            is_absolute = False
-            dir_part = ""
-
-        print(f"Searching in: '{search_dir}' for files starting with '{file_part}'")  # Debug
+            try:
+                os.chdir(path)
+                current_dir.set(os.getcwd())
+                return {
+                    "command": cmd,
+                    "output": "",
+                    "return_code": 0,
+                    "success": True,
+                }
+            except OSError as e:
+                return {
+                    "command": cmd,
+                    "output": f"cd: {e}",
+                    "return_code": 1,
+                    "success": False,
+                }
 
+        if cmd.strip() in ("share", "unshare", "unwatch") or cmd.strip().startswith("watch "):
+            return handle_broadcast_command(cmd)
+        if cmd.strip().startswith("download "):
+            return await start_download(cmd)
+        if cmd.strip() == "upload" or cmd.strip().startswith("upload "):
+            # The browser picks files and sends them via upload_start
+            return {
+                "command": cmd,
+                "output": "upload: choose files in the browser dialog",
+                "return_code": 0,
+                "success": True,
+            }
+        if cmd.strip() == "recordings":
+            return list_recordings(cmd)
+        if cmd.strip().startswith("replay "):
+            return replay_recording(cmd)
+
+        return None
+
+    def error_result(cmd, e):
+        return {
+            "command": cmd,
+            "output": f"Error: {str(e)}",
+            "return_code": -1,
+            "success": False,
+        }
+
+    async def execute_command(cmd):
         try:
-            if os.path.isdir(search_dir):
-                for item in os.listdir(search_dir):
-                    if item.startswith(file_part):
-                        item_path = os.path.join(search_dir, item)
-
-                        # Build the completion with proper path prefix
-                        if dir_part:
-                            if is_absolute:
-                                completion = os.path.join(dir_part, item)
-                            else:
-                                completion = os.path.join(dir_part, item)
-                        else:
-                            completion = item
-
-                        if os.path.isdir(item_path):
-                            completion += "/"
-
-                        completions.append(completion)
-                        print(f"Added completion: '{completion}'")  # Debug
-        except (PermissionError, OSError) as e:
-            print(f"Error accessing directory: {e}")  # Debug
-
-        return sorted(completions)
-
-    def find_completion_bounds(command, cursor_pos):
-        # Find the start and end of the word being completed
-        start = cursor_pos
-        while start > 0 and not command[start - 1].isspace():
-            start -= 1
-
-        end = cursor_pos
-        while end < len(command) and not command[end].isspace():
-            end += 1
-
-        print(f"Completion bounds for '{command}' at pos {cursor_pos}: start={start}, end={end}")
-        print(f"Word being completed: '{command[start:end]}'")
-        return start, end
-
-    def find_common_prefix(completions):
-        if not completions:
-            return ""
+            result = await run_builtin(cmd)
+            if result is None:
+                # Execute other commands
+                result = run_shell_command(cmd, current_dir.get(), child_pgids)
+            return result
+        except Exception as e:
+            return error_result(cmd, e)
+
+    def start_watching(token):
+        channel = broadcast_channels.get(token)
+        if channel is None:
+            return f"watch: no shared session {token}"
+        if channel is sharing_channel:
+            return "watch: can't watch your own session"
+        stop_watching()
+        channel.subscribe(session)
+        watching.set(token)
+        return None
+
+    def stop_watching():
+        token = watching.get()
+        channel = broadcast_channels.get(token)
+        if channel is not None:
+            channel.unsubscribe(
+                session.id, str(ui.div("[stopped watching]", class_="terminal-output"))
+            )
+        watching.set(None)
+
+    def handle_broadcast_command(cmd):
+        nonlocal sharing_channel
+        args = cmd.strip().split()
+        output = ""
+        success = True
+
+        if args[0] == "share":
+            if sharing_channel is None:
+                sharing_channel = BroadcastChannel(secrets.token_urlsafe(8))
+                broadcast_channels[sharing_channel.token] = sharing_channel
+                # Late joiners start from the recent scrollback
+                for entry in terminal_session.get()[-BROADCAST_BACKLOG:]:
+                    sharing_channel.publish(str(ui.TagList(*render_entry(entry))))
+            token = sharing_channel.token
+            output = (
+                f"Sharing this session read-only. Viewers can run `watch {token}` "
+                f"or open this page with ?watch={token}"
+            )
+        elif args[0] == "unshare":
+            if sharing_channel is None:
+                output, success = "unshare: this session isn't shared", False
+            else:
+                viewers = len(sharing_channel.viewers)
+                sharing_channel.close(str(ui.div("[sharing stopped]", class_="terminal-output error-output")))
+                sharing_channel = None
+                output = f"Stopped sharing ({viewers} viewer(s) disconnected)"
+        elif args[0] == "watch":
+            error = start_watching(args[1])
+            if error:
+                output, success = error, False
+        elif args[0] == "unwatch":
+            if watching.get() is None:
+                output, success = "unwatch: not watching a session", False
+            else:
+                stop_watching()
+
+        return {"command": cmd, "output": output, "return_code": 0 if success else 1, "success": success}
+
+    def read_only_result(cmd):
+        # While watching, only `unwatch` is allowed; the shared session has
+        # ended if its channel is gone
+        token = watching.get()
+        if token is None or cmd.strip() == "unwatch":
+            return None
+        if token not in broadcast_channels:
+            watching.set(None)
+            return None
+        return {
+            "command": cmd,
+            "output": f"Watching shared session {token} (read-only); type `unwatch` to stop",
+            "return_code": 1,
+            "success": False,
+        }
 
-        if len(completions) == 1:
-            return completions[0]
+    @reactive.effect
+    def watch_from_url():
+        token = parse_qs(session.clientdata.url_search().lstrip("?")).get("watch", [None])[0]
+        if token:
+            with reactive.isolate():
+                error = start_watching(token)
+                if error:
+                    add_to_session("", "", error, False)
+
+    async def start_download(cmd):
+        args = command_args(cmd)
+        if len(args) != 1:
+            return {"command": cmd, "output": "usage: download <path>", "return_code": 1, "success": False}
+        arg = args[0]
+        path = os.path.join(current_dir.get(), os.path.expanduser(arg))
+        if not os.path.isfile(path):
+            return {"command": cmd, "output": f"download: {arg}: not a file", "return_code": 1, "success": False}
+
+        # The token stays valid for the session so the browser can resume
+        token = secrets.token_urlsafe(16)
+        downloads[token] = path
+        name = os.path.basename(path)
+        # Sent directly so that several downloads in one batch all start
+        await session.send_custom_message(
+            "start_download", {"url": f"{download_url}&token={token}", "name": name}
+        )
+        return {
+            "command": cmd,
+            "output": f"download: sending {name} ({format_size(os.path.getsize(path))})",
+            "return_code": 0,
+            "success": True,
+        }
 
-        common = completions[0]
-        for completion in completions[1:]:
-            while common and not completion.startswith(common):
-                common = common[:-1]
+    @reactive.effect
+    @reactive.event(client_message)
+    async def send_client_message():
+        message = client_message.get()
+        if message:
+            await session.send_custom_message(message["type"], message)
+
+    async def send_upload_ack(upload_id, **ack):
+        await session.send_custom_message(
+            "upload_ack", {"id": upload_id, "chunk_size": UPLOAD_CHUNK_BYTES, **ack}
+        )
 
-        return common
+    async def fail_upload(upload_id, error):
+        uploads.pop(upload_id, None)
+        add_to_session("", "", f"upload: {error}", False)
+        await send_upload_ack(upload_id, error=True)
 
-    def execute_command(cmd):
+    async def finish_upload(upload_id):
+        upload = uploads.pop(upload_id)
         try:
-            # Handle cd command specially to update working directory
-            if cmd.strip().startswith("cd "):
-                path = cmd.strip()[3:].strip()
-                if not path:
-                    path = os.environ.get("HOME", os.getcwd())
-                elif path == "~":
-                    path = os.environ.get("HOME", os.getcwd())
-                elif path.startswith("~/"):
-                    path = os.path.join(os.environ.get("HOME", os.getcwd()), path[2:])
+            if not os.path.exists(upload["part"]):
+                # An empty file never gets a chunk
+                open(upload["part"], "wb").close()
+            # Never overwrite a file that is already there
+            path = unused_path(upload["path"])
+            os.replace(upload["part"], path)
+        except OSError as e:
+            await fail_upload(upload_id, e)
+            return
+        saved = f"upload: saved {path} ({format_size(upload['size'])})"
+        if path != upload["path"]:
+            saved += f"; {os.path.basename(upload['path'])} already exists"
+        add_to_session("", "", saved, True)
+        await send_upload_ack(upload_id, offset=upload["size"], done=True)
 
-                try:
-                    os.chdir(path)
-                    current_dir.set(os.getcwd())
-                    return {
-                        "command": cmd,
-                        "output": "",
-                        "return_code": 0,
-                        "success": True,
-                    }
-                except OSError as e:
-                    return {
-                        "command": cmd,
-                        "output": f"cd: {e}",
-                        "return_code": 1,
-                        "success": False,
-                    }
+    @reactive.effect
+    @reactive.event(input.upload_start)
+    async def handle_upload_start():
+        request = json.loads(input.upload_start())
+        touch_activity()
+        upload_id = request["id"]
+        cmd = request["command"].strip()
+        size = int(request["size"])
+
+        args = command_args(cmd)
+        dest = os.path.join(current_dir.get(), os.path.expanduser(args[0])) if args else current_dir.get()
+        name = os.path.basename(request["name"])
+        if not os.path.isdir(dest) or not os.access(dest, os.W_OK) or name in ("", ".", ".."):
+            add_to_session(get_prompt(), cmd, f"upload: can't write {name!r} to {dest}", False)
+            await send_upload_ack(upload_id, error=True)
+            return
+
+        # Partial uploads are keyed by size and modification time, so
+        # choosing the same file again resumes where it stopped
+        part = os.path.join(dest, f".{name}.{size}-{request['last_modified']}.part")
+        try:
+            offset = min(os.path.getsize(part), size) if os.path.exists(part) else 0
+        except OSError as e:
+            add_to_session(get_prompt(), cmd, f"upload: {e}", False)
+            await send_upload_ack(upload_id, error=True)
+            return
+        uploads[upload_id] = {"path": os.path.join(dest, name), "part": part, "size": size}
+
+        verb = f"resuming at {format_size(offset)} of" if offset else "receiving"
+        add_to_session(get_prompt(), cmd, f"upload: {verb} {name} ({format_size(size)})", True)
+        if offset >= size:
+            await finish_upload(upload_id)
+        else:
+            await send_upload_ack(upload_id, offset=offset)
 
-            # Execute other commands
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=30,
-                cwd=current_dir.get(),
-            )
+    @reactive.effect
+    @reactive.event(input.upload_chunk)
+    async def handle_upload_chunk():
+        request = json.loads(input.upload_chunk())
+        touch_activity()
+        upload_id = request["id"]
+        upload = uploads.get(upload_id)
+        if upload is None:
+            await send_upload_ack(upload_id, error=True)
+            return
 
-            output_text = ""
-            if result.stdout:
-                output_text += result.stdout
-            if result.stderr:
-                output_text += result.stderr
+        try:
+            offset = os.path.getsize(upload["part"]) if os.path.exists(upload["part"]) else 0
+            if request["offset"] == offset:
+                data = base64.b64decode(request["data"])
+                with open(upload["part"], "ab") as f:
+                    f.write(data)
+                offset += len(data)
+            # Otherwise the browser is out of step; the ack tells it where to resume
+        except (OSError, ValueError) as e:
+            # Full disk, bad chunk or destination removed; the .part file is
+            # kept so the upload can be resumed
+            await fail_upload(upload_id, e)
+            return
+
+        if offset >= upload["size"]:
+            await finish_upload(upload_id)
+        else:
+            await send_upload_ack(upload_id, offset=offset)
+
+    def run_search(cmd):
+        # search [-r] [-c] <pattern>; a bare `search` closes the results
+        rest = cmd.strip()[len("search"):].strip()
+        regex = case_sensitive = False
+        while rest.startswith("-"):
+            flag, _, remainder = rest.partition(" ")
+            if flag == "--":
+                rest = remainder.strip()
+                break
+            if not set(flag[1:]) <= {"r", "c"}:
+                break
+            regex = regex or "r" in flag
+            case_sensitive = case_sensitive or "c" in flag
+            rest = remainder.strip()
+
+        if not rest:
+            search_results.set(None)
+            return
+
+        started = time.monotonic()
+        try:
+            results, more = scrollback_index.search(rest, regex=regex, case_sensitive=case_sensitive)
+        except re.error as e:
+            search_results.set({"pattern": rest, "error": f"search: bad pattern: {e}"})
+            return
+        elapsed = time.monotonic() - started
+        print(f"Search for {rest!r} found {len(results)} entries in {elapsed * 1000:.1f}ms")  # Debug
+
+        search_results.set(
+            {"pattern": rest, "results": results, "more": more, "elapsed": elapsed}
+        )
+        in_memory = [entry_id for entry_id, _, _, spilled in results if not spilled]
+        if in_memory:
+            client_message.set({"type": "search_jump", "entry": in_memory[0]})
+
+    def list_recordings(cmd):
+        if not RECORDING_DIR or not os.path.isdir(RECORDING_DIR):
+            return {"command": cmd, "output": "recordings: recording is off", "return_code": 1, "success": False}
+
+        lines = []
+        names = sorted(
+            name for name in os.listdir(RECORDING_DIR)
+            if name.endswith(".cast") or name.endswith(".cast.gz")
+        )
+        for name in names:
+            stat = os.stat(os.path.join(RECORDING_DIR, name))
+            modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(stat.st_mtime))
+            current = "  (this session)" if recorder is not None and recorder.path.endswith(name) else ""
+            lines.append(f"{stat.st_size:>12}  {modified}  {name}{current}")
+        return {"command": cmd, "output": "\n".join(lines), "return_code": 0, "success": True}
+
+    def replay_recording(cmd):
+        # replay <recording> [start] [count]
+        args = cmd.strip().split()[1:]
+        path = os.path.join(current_dir.get(), os.path.expanduser(args[0]))
+        if not os.path.exists(path) and RECORDING_DIR:
+            # A bare name from `recordings`
+            path = os.path.join(RECORDING_DIR, args[0])
 
-            return {
-                "command": cmd,
-                "output": output_text,
-                "return_code": result.returncode,
-                "success": result.returncode == 0,
-            }
-        except subprocess.TimeoutExpired:
-            return {
-                "command": cmd,
-                "output": "Command timed out (30s limit)",
-                "return_code": -1,
-                "success": False,
-            }
-        except Exception as e:
-            return {
-                "command": cmd,
-                "output": f"Error: {str(e)}",
-                "return_code": -1,
-                "success": False,
-            }
+        try:
+            start = parse_timestamp(args[1]) if len(args) > 1 else 0.0
+            limit = int(args[2]) if len(args) > 2 else 200
+            if recorder is not None and os.path.samefile(path, recorder.path):
+                recorder.flush()
+            header, events, next_time = read_recording(path, start, limit)
+        except (OSError, ValueError) as e:
+            return {"command": cmd, "output": f"replay: {e}", "return_code": 1, "success": False}
+
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(header.get("timestamp", 0)))
+        lines = [f"--- {os.path.basename(path)}, recorded {started}, from {format_timestamp(start)} ---"]
+        for t, code, data in events:
+            if code == "o":
+                lines.append(f"[{format_timestamp(t)}] {data.replace(chr(13), '').rstrip()}")
+        if next_time is None:
+            lines.append("--- end of recording ---")
+        else:
+            lines.append(f"--- more: replay {args[0]} {next_time:.3f} {limit} ---")
+        return {"command": cmd, "output": "\n".join(lines), "return_code": 0, "success": True}
 
     def add_to_session(prompt, cmd, output, success):
+        nonlocal next_entry_id
+        entry = {"id": next_entry_id, "prompt": prompt, "command": cmd, "output": output, "success": success}
+        next_entry_id += 1
+        scrollback_index.add(entry["id"], entry)
+
         session_data = list(terminal_session.get())
-        session_data.append(
-            {"prompt": prompt, "command": cmd, "output": output, "success": success}
-        )
+        session_data.append(entry)
         terminal_session.set(session_data)
 
+        if sharing_channel is not None:
+            sharing_channel.publish(str(ui.TagList(*render_entry(session_data[-1]))))
+
+        if recorder is not None:
+            recorder.record_command(prompt, cmd, output)
+
         # Add to command history for navigation (only non-empty commands)
         if cmd.strip():
             history = list(command_history_list.get())
@@ -533,9 +2373,98 @@ def server(input, output, session):
             command_history_list.set(history)
             history_index.set(-1)  # Reset history navigation
 
+    def touch_activity():
+        nonlocal last_activity, reaped
+        last_activity = time.monotonic()
+        reaped = False
+
+    def reap_session(idle_seconds, killed):
+        nonlocal reaped
+        entries = terminal_session.get()
+        history = command_history_list.get()
+
+        spill_path = os.path.join(SPILL_DIR, f"{session.id}.jsonl")
+        bytes_reclaimed = sum(len(cmd.encode("utf-8")) for cmd in history)
+        spill_error = None
+        if entries:
+            try:
+                bytes_reclaimed += spill_scrollback(spill_path, entries, scrollback_index)
+            except OSError as e:
+                spill_error = e
+
+        reaper_stats["processes_killed"] += killed
+        if spill_error is None:
+            if entries:
+                notice = f"[idle for {int(idle_seconds)}s: scrollback saved to {spill_path}]"
+            else:
+                notice = f"[idle for {int(idle_seconds)}s]"
+            if killed:
+                notice += f" [killed {killed} background process group(s)]"
+            terminal_session.set(
+                [{"prompt": "", "command": "", "output": notice, "success": True}]
+            )
+            command_history_list.set([])
+            history_index.set(-1)
+            current_completions.set([])
+            reaped = True
+
+            reaper_stats["sessions_reaped"] += 1
+            reaper_stats["entries_spilled"] += len(entries)
+            reaper_stats["bytes_reclaimed"] += bytes_reclaimed
+            outcome = f"{len(entries)} entries, {bytes_reclaimed} bytes reclaimed"
+        else:
+            # Keep the scrollback in memory; the next tick tries again
+            outcome = f"scrollback kept in memory, couldn't save it: {spill_error}"
+        print(
+            f"Reaped idle session {session.id}: {outcome}, {killed} process group(s) killed; "
+            f"totals: {reaper_stats}"
+        )
+
+    @reactive.effect
+    async def reap_if_idle():
+        reactive.invalidate_later(REAPER_INTERVAL)
+        prune_process_groups(child_pgids)
+        idle_seconds = time.monotonic() - last_activity
+        if reaped or idle_seconds < IDLE_TIMEOUT:
+            return
+        with reactive.isolate():
+            if not (terminal_session.get() or command_history_list.get() or child_pgids):
+                return
+        # Killing can wait out two grace periods; don't hold up other sessions
+        killed = await asyncio.to_thread(kill_process_groups, child_pgids)
+        with reactive.isolate():
+            reap_session(idle_seconds, killed)
+
+    @reactive.effect
+    def flush_recording():
+        reactive.invalidate_later(RECORDING_FLUSH_INTERVAL)
+        if recorder is not None:
+            recorder.flush()
+
+    async def cleanup_session():
+        # Processes first, so nothing below can leave them running
+        killed = await asyncio.to_thread(kill_process_groups, child_pgids)
+        # The browser tab is gone; nothing can read the spill file any more
+        spill_path = os.path.join(SPILL_DIR, f"{session.id}.jsonl")
+        try:
+            os.remove(spill_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing {spill_path}: {e}")  # Debug
+        if recorder is not None:
+            recorder.close()
+        if sharing_channel is not None:
+            sharing_channel.close(str(ui.div("[shared session ended]", class_="terminal-output error-output")))
+        for channel in list(broadcast_channels.values()):
+            channel.unsubscribe(session.id)
+        print(f"Session {session.id} ended, killed {killed} process group(s)")
+
+    session.on_ended(cleanup_session)
+
     @reactive.effect
     @reactive.event(input.execute_cmd, ignore_init=True)
-    def handle_command():
+    async def handle_command():
         cmd_with_timestamp = input.execute_cmd()
         if cmd_with_timestamp:
             # Remove timestamp suffix to get actual command
@@ -545,15 +2474,86 @@ def server(input, output, session):
             if cmd == "init":
                 return
 
+            touch_activity()
+
+            if cmd.strip() == "search" or cmd.strip().startswith("search "):
+                # Searching doesn't add to the scrollback it searches
+                run_search(cmd)
+                ui.update_text("command", value="")
+                return
+
             if cmd.strip():
                 prompt = get_prompt()
-                result = execute_command(cmd.strip())
+                result = read_only_result(cmd.strip()) or await execute_command(cmd.strip())
                 add_to_session(prompt, cmd.strip(), result["output"], result["success"])
 
             # Clear completions and input
             current_completions.set([])
             ui.update_text("command", value="")
 
+    @reactive.effect
+    @reactive.event(input.execute_batch)
+    async def handle_batch():
+        batch_request = input.execute_batch()
+        if not batch_request:
+            return
+        try:
+            script = json.loads(batch_request).get("script", "")
+        except json.JSONDecodeError as e:
+            print(f"Failed to parse batch request: {e}")  # Debug print
+            return
+
+        touch_activity()
+        read_only = read_only_result(script)
+        if read_only is not None:
+            add_to_session(get_prompt(), "", read_only["output"], False)
+            ui.update_text("command", value="")
+            return
+        steps = parse_batch_script(script)
+        loop = asyncio.get_running_loop()
+        results = []
+        batch_start = time.monotonic()
+
+        async def run_step_command(cmd, cwd):
+            # Built-ins touch session state, so they stay on the event loop;
+            # everything else goes to the shell on a worker thread
+            name = cmd.split()[0]
+            if name in ("upload", "search"):
+                # The file dialog and search results only work for a typed
+                # command
+                result = {
+                    "command": cmd,
+                    "output": f"{name}: can't be used in a batch; run it on its own",
+                    "return_code": 1,
+                    "success": False,
+                }
+            else:
+                try:
+                    result = await run_builtin(cmd)
+                except Exception as e:
+                    result = error_result(cmd, e)
+            if result is None:
+                return await loop.run_in_executor(batch_executor, run_shell_command, cmd, cwd, child_pgids)
+            result["elapsed"] = 0.0
+            return result
+
+        for step in steps:
+            prompt = get_prompt()
+            cwd = current_dir.get()
+            step_results = await asyncio.gather(*(run_step_command(cmd, cwd) for cmd in step))
+
+            # Output is shown per command, in script order
+            for result in step_results:
+                add_to_session(prompt, result["command"], result["output"], result["success"])
+            results.extend(step_results)
+
+        if results:
+            summary = format_batch_summary(results, time.monotonic() - batch_start)
+            add_to_session("", "", summary, all(result["success"] for result in results))
+
+        current_completions.set([])
+        ui.update_text("command", value="")
+
     @reactive.effect
     @reactive.event(input.tab_complete)
     async def handle_tab_completion():
@@ -561,6 +2561,7 @@ def server(input, output, session):
         print(f"Tab completion received: {tab_request}")  # Debug print
 
         if tab_request:
+            touch_activity()
             try:
                 # Parse the JSON string
                 tab_data = json.loads(tab_request)
@@ -571,12 +2572,12 @@ def server(input, output, session):
                 print(f"Processing completion for: '{command}' at pos {cursor_pos}")  # Debug print
 
                 # Get completions
-                completions = get_tab_completions(command, cursor_pos)
+                completions, context = await get_tab_completions(command, cursor_pos)
                 print(f"Found completions: {completions}")  # Debug print
 
                 if completions:
-                    # Find the bounds of the word being completed
-                    start_pos, end_pos = find_completion_bounds(command, cursor_pos)
+                    # Bounds of the word being completed, including any quotes
+                    start_pos, end_pos = context["start"], context["end"]
 
                     # Calculate common prefix
                     common_prefix = find_common_prefix(completions)
@@ -640,19 +2641,20 @@ def server(input, output, session):
         # Display all previous commands and outputs
         for i, entry in enumerate(session_data):
             print(f"Entry {i}: prompt='{entry['prompt']}', command='{entry['command']}', output='{entry['output'][:50]}...' if len > 50")  # Debug print
-
-            # Show prompt + command
-            if entry['prompt'] or entry['command']:
-                elements.append(
-                    ui.div(f"{entry['prompt']}{entry['command']}", class_="terminal-output")
-                )
-
-            # Show output if any
-            if entry["output"]:
-                output_class = "success-output" if entry["success"] else "error-output"
-                elements.append(
-                    ui.div(entry["output"], class_=f"terminal-output {output_class}")
+            if "id" in entry:
+                # Anchor for jumping to search results
+                elements.append(ui.div(*render_entry(entry), id=f"entry-{entry['id']}"))
+            else:
+                elements.extend(render_entry(entry))
+
+        token = watching.get()
+        if token is not None:
+            elements.append(
+                ui.div(
+                    f"[watching shared session {token} above (read-only); type `unwatch` to stop]",
+                    class_="terminal-output timestamp",
                 )
+            )
 
         # Add current prompt line with input
         current_prompt = get_prompt()
@@ -666,6 +2668,35 @@ def server(input, output, session):
 
         return ui.div(*elements)
 
+    @render.ui
+    def search_display():
+        search = search_results.get()
+        if search is None:
+            return ui.div()
+        if "error" in search:
+            return ui.div(search["error"], class_="search-results terminal-output error-output")
+
+        count = f"{len(search['results'])}{'+' if search['more'] else ''}"
+        elements = [
+            ui.div(
+                f"search `{search['pattern']}`: {count} matching entries in "
+                f"{search['elapsed'] * 1000:.1f}ms (run `search` to close)",
+                class_="timestamp",
+            )
+        ]
+        for entry_id, entry, match, spilled in search["results"]:
+            label = f"{entry['command'] or '(output)'}{' (spilled)' if spilled else ''}: "
+            attrs = {} if spilled else {"data_entry": f"entry-{entry_id}"}
+            elements.append(
+                ui.div(
+                    ui.span(label, class_="timestamp"),
+                    *highlight_match(entry_text(entry), match),
+                    class_="search-result",
+                    **attrs,
+                )
+            )
+        return ui.div(*elements, class_="search-results")
+
     @render.ui
     def completions_display():
         completions = current_completions.get()
@@ -0,0 +1,47 @@
+def test_parse_batch_script(shell):
+    script = """
+# set up
+cd ~/projects
+parallel:
+    git -C api status
+    git -C web status
+
+echo done
+"""
+    assert shell.parse_batch_script(script) == [
+        ["cd ~/projects"],
+        ["git -C api status", "git -C web status"],
+        ["echo done"],
+    ]
+
+
+def test_parse_batch_script_unindented_line_ends_parallel_block(shell):
+    script = "parallel:\n  a\nb\n  c\n"
+    assert shell.parse_batch_script(script) == [["a"], ["b"], ["c"]]
+
+
+def test_parse_batch_script_drops_empty_parallel_block(shell):
+    assert shell.parse_batch_script("parallel:\necho hi") == [["echo hi"]]
+
+
+def test_run_shell_command(shell, tmp_path):
+    child_pgids = set()
+    result = shell.run_shell_command("pwd; echo oops >&2; exit 3", str(tmp_path), child_pgids)
+    assert result["output"] == f"{tmp_path}\noops\n"
+    assert result["return_code"] == 3
+    assert not result["success"]
+    assert result["elapsed"] >= 0
+    assert child_pgids == set()
+
+
+def test_format_batch_summary(shell):
+    results = [
+        {"command": "true", "return_code": 0, "success": True, "elapsed": 0.25},
+        {"command": "false", "return_code": 1, "success": False, "elapsed": 1.5},
+    ]
+    assert shell.format_batch_summary(results, 1.75).splitlines() == [
+        "batch: 2 commands in 1.75s (1 succeeded, 1 failed)",
+        "  exit      time  command",
+        "     0     0.25s  true",
+        "     1     1.50s  false",
+    ]
@@ -0,0 +1,81 @@
+import asyncio
+
+
+class Viewer:
+    def __init__(self, id):
+        self.id = id
+        self.messages = []
+
+    async def send_custom_message(self, type, message):
+        self.messages.append((type, message))
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_viewers_get_backlog_then_chunks(shell):
+    async def main():
+        channel = shell.BroadcastChannel("token")
+        channel.publish("<a>")
+        first, late = Viewer("first"), Viewer("late")
+        channel.subscribe(first)
+        await settle()
+        channel.publish("<b>")
+        channel.subscribe(late)
+        channel.publish("<c>")
+        await settle()
+        return first.messages, late.messages
+
+    first, late = asyncio.run(main())
+    assert first == [
+        ("broadcast_chunk", {"html": "<a>", "reset": True}),
+        ("broadcast_chunk", {"html": "<b>"}),
+        ("broadcast_chunk", {"html": "<c>"}),
+    ]
+    assert late == [
+        ("broadcast_chunk", {"html": "<a><b>", "reset": True}),
+        ("broadcast_chunk", {"html": "<c>"}),
+    ]
+
+
+def test_viewer_that_falls_behind_skips_to_backlog(shell, monkeypatch):
+    monkeypatch.setattr(shell, "BROADCAST_BACKLOG", 3)
+
+    async def main():
+        channel = shell.BroadcastChannel("token")
+        viewer = Viewer("slow")
+        channel.subscribe(viewer)
+        # No awaits, so the writer task can't keep up
+        for i in range(5):
+            channel.publish(f"<{i}>")
+        await settle()
+        return viewer.messages
+
+    messages = asyncio.run(main())
+    # The queue was full when <2> arrived, so it was replaced by the backlog
+    assert messages == [
+        ("broadcast_chunk", {"html": "<0><1><2>", "reset": True}),
+        ("broadcast_chunk", {"html": "<3>"}),
+        ("broadcast_chunk", {"html": "<4>"}),
+    ]
+
+
+def test_close_and_unsubscribe(shell):
+    async def main():
+        channel = shell.BroadcastChannel("token")
+        shell.broadcast_channels["token"] = channel
+        leaving, staying = Viewer("leaving"), Viewer("staying")
+        channel.subscribe(leaving)
+        channel.subscribe(staying)
+        channel.unsubscribe("leaving", "<bye>")
+        channel.close("<ended>")
+        await settle()
+        return channel, leaving.messages, staying.messages
+
+    channel, leaving, staying = asyncio.run(main())
+    assert leaving[-1] == ("broadcast_chunk", {"html": "<bye>", "closed": True})
+    assert staying[-1] == ("broadcast_chunk", {"html": "<ended>", "closed": True})
+    assert channel.viewers == {}
+    assert "token" not in shell.broadcast_channels
@@ -8,6 +8,8 @@ import tempfile
 import shutil
 from pathlib import Path
 
+import pytest
+
 # Create a test directory structure
 def setup_test_directory():
     """Create a temporary directory with known structure for testing"""
@@ -26,6 +28,10 @@ def setup_test_directory():
             "file1.csv": "",
             "file2.json": ""
         },
+        "My Docs/": {
+            "report.txt": "",
+            "resume.txt": ""
+        },
         "py-connect/": {},
         "py-shiny/": {},
         "pyproject.toml": ""
@@ -100,7 +106,7 @@ test_cases = [
         "input": "cd ./d",
         "cursor_pos": 6,
         "expected_type": "files",
-        "expected_contains": ["data/", "docs/"]
+        "expected_contains": ["./data/", "./docs/"]
     },
     {
         "name": "Parent directory",
@@ -126,6 +132,99 @@ test_cases = [
         "expected_multiple": True
     },
 
+    # Quoting and escapes
+    {
+        "name": "Inside double quotes",
+        "input": 'cat "My Docs/rep',
+        "cursor_pos": 16,
+        "expected_type": "files",
+        "expected_contains": ['"My Docs/report.txt"'],
+        "description": "Should keep the quote open while completing and close it after a file"
+    },
+    {
+        "name": "Escaped space",
+        "input": "cat My\\ Docs/re",
+        "cursor_pos": 15,
+        "expected_type": "files",
+        "expected_contains": ["My\\ Docs/report.txt", "My\\ Docs/resume.txt"]
+    },
+    {
+        "name": "Directory with a space",
+        "input": "cd My",
+        "cursor_pos": 5,
+        "expected_type": "files",
+        "expected_contains": ["My\\ Docs/"],
+        "description": "Should escape the space in the completion"
+    },
+
+    # Word kinds
+    {
+        "name": "Command after a pipe",
+        "input": "ls | gr",
+        "cursor_pos": 7,
+        "expected_type": "commands",
+        "expected_contains": ["grep"]
+    },
+    {
+        "name": "Environment variable",
+        "input": "echo $HO",
+        "cursor_pos": 8,
+        "expected_type": "env",
+        "expected_contains": ["$HOME"]
+    },
+    {
+        "name": "Redirection target",
+        "input": "ls > da",
+        "cursor_pos": 7,
+        "expected_type": "files",
+        "expected_contains": ["data/"]
+    },
+
+    # Arguments from --help; test_help.py checks what is parsed from it
+    {
+        "name": "Subcommand",
+        "input": "git comm",
+        "cursor_pos": 8,
+        "expected_type": "subcommands",
+        "description": "Should parse subcommands from git's help output"
+    },
+    {
+        "name": "Long flag",
+        "input": "ls --al",
+        "cursor_pos": 7,
+        "expected_type": "flags"
+    },
+    {
+        "name": "Top-level flag",
+        "input": "git --ver",
+        "cursor_pos": 9,
+        "expected_type": "flags"
+    },
+
+    # Wildcard expansion
+    {
+        "name": "Wildcard in directory",
+        "input": "ls data/*.csv",
+        "cursor_pos": 13,
+        "expected_type": "glob",
+        "expected_contains": ["data/file1.csv"],
+        "description": "Should expand the word in place"
+    },
+    {
+        "name": "Recursive wildcard",
+        "input": "ls **/*.txt",
+        "cursor_pos": 11,
+        "expected_type": "glob",
+        "expected_contains": ["application.txt", "docs/guide.txt"]
+    },
+    {
+        "name": "Wildcard with no matches",
+        "input": "ls *.nothing",
+        "cursor_pos": 12,
+        "expected_type": "glob",
+        "description": "Should leave the word unchanged"
+    },
+
     # Boundary conditions
     {
         "name": "Cursor in middle of word",
@@ -149,35 +248,82 @@ test_cases = [
     }
 ]
 
-def run_completion_tests():
-    """Run all completion tests"""
-    print("Setting up test directory...")
+# Which kind of word get_completion_context should find for each expected_type.
+# Subcommands and flags complete arguments, which it reports as paths
+EXPECTED_KINDS = {
+    "commands": {"command"},
+    "files": {"path", "redirect"},
+    "env": {"env"},
+    "glob": {"path"},
+    "subcommands": {"path"},
+    "flags": {"path"},
+}
+
+
+@pytest.fixture(scope="module")
+def test_dir():
     test_dir = setup_test_directory()
-    print(f"Test directory created at: {test_dir}")
+    yield test_dir
+    shutil.rmtree(test_dir)
 
-    # Import the completion functions from shiny-shell
-    # Note: This would need to be adapted to import from the actual module
 
-    print("\nRunning completion tests:")
-    print("=" * 50)
+@pytest.mark.parametrize(
+    "test_case", [case for case in test_cases if "expected_type" in case], ids=lambda case: case["name"]
+)
+def test_completion_kind(shell, test_case):
+    context = shell.get_completion_context(
+        shell.CommandLineTokenizer(), test_case["input"], test_case["cursor_pos"]
+    )
+    assert context["kind"] in EXPECTED_KINDS[test_case["expected_type"]]
 
-    for i, test_case in enumerate(test_cases, 1):
-        print(f"\nTest {i}: {test_case['name']}")
-        print(f"Input: '{test_case['input']}' (cursor at {test_case['cursor_pos']})")
 
-        # Here we would call the actual completion functions
-        # For now, just print what we would test
-        if 'expected_contains' in test_case:
-            print(f"Expected to contain: {test_case['expected_contains']}")
-        if 'expected_common_prefix' in test_case:
-            print(f"Expected common prefix: '{test_case['expected_common_prefix']}'")
-        if 'description' in test_case:
-            print(f"Description: {test_case['description']}")
+def get_completions(shell, test_case, directory):
+    # The completions Tab offers for kinds that don't need --help or
+    # wildcard expansion, quoted the way the word was typed
+    context = shell.get_completion_context(
+        shell.CommandLineTokenizer(), test_case["input"], test_case["cursor_pos"]
+    )
+    word, quote = context["word"], context["quote"]
+    if context["kind"] == "env":
+        return shell.get_env_completions(word)
+    if context["kind"] == "command":
+        return [shell.quote_completion(c, quote) for c in shell.get_command_completions(word)]
+    completions = shell.get_file_completions(word, directory)
+    return [shell.quote_completion(c, quote, closed=not c.endswith("/")) for c in completions]
 
-        print("Status: PENDING (needs implementation)")
 
-    print(f"\nCleaning up test directory: {test_dir}")
-    shutil.rmtree(test_dir)
+@pytest.mark.parametrize(
+    "test_case",
+    [
+        case for case in test_cases
+        if case.get("expected_type") not in ("glob", "subcommands", "flags")
+        and ("expected_contains" in case or "expected_common_prefix" in case)
+    ],
+    ids=lambda case: case["name"],
+)
+def test_completions(shell, test_dir, test_case):
+    completions = get_completions(shell, test_case, test_dir)
+    assert set(test_case.get("expected_contains", [])) <= set(completions)
+    if "expected_common_prefix" in test_case:
+        assert shell.find_common_prefix(completions) == test_case["expected_common_prefix"]
+    if test_case.get("expected_multiple"):
+        assert len(completions) > 1
+
+
+@pytest.mark.parametrize(
+    "test_case", [case for case in test_cases if case.get("expected_type") == "glob"], ids=lambda case: case["name"]
+)
+def test_wildcard_cases(shell, test_dir, test_case):
+    context = shell.get_completion_context(
+        shell.CommandLineTokenizer(), test_case["input"], test_case["cursor_pos"]
+    )
+    assert shell.has_wildcards(context["word"])
+    matches, complete = shell.expand_glob(context["word"], test_dir)
+    assert complete
+    assert set(test_case.get("expected_contains", [])) <= set(matches)
+    if "expected_contains" not in test_case:
+        assert matches == []
+
 
 if __name__ == "__main__":
-    run_completion_tests()
\ No newline at end of file
+    raise SystemExit(pytest.main([__file__, "-v"]))
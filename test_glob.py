@@ -0,0 +1,74 @@
+import pytest
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for path in ["app.py", "app.js", "application.txt", ".hidden.txt", "docs/readme.md", "docs/guide.txt",
+                 "docs/deep/notes.txt", "data/file1.csv", "data/file2.json"]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("")
+    return tmp_path
+
+
+def test_has_wildcards(shell):
+    assert shell.has_wildcards("*.py")
+    assert shell.has_wildcards("file?.csv")
+    assert shell.has_wildcards("[ab]c")
+    assert not shell.has_wildcards("plain.txt")
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        ("app.*", ["app.js", "app.py"]),
+        ("data/*.csv", ["data/file1.csv"]),
+        ("data/file?.*", ["data/file1.csv", "data/file2.json"]),
+        ("*/", ["data/", "docs/"]),
+        ("**/*.txt", ["application.txt", "docs/deep/notes.txt", "docs/guide.txt"]),
+        ("*.nothing", []),
+        # Dotfiles only match when the pattern asks for them
+        (".*.txt", [".hidden.txt"]),
+    ],
+)
+def test_expand_glob(shell, tree, pattern, expected):
+    assert shell.expand_glob(pattern, str(tree)) == (expected, True)
+
+
+def test_expand_glob_absolute(shell, tree):
+    matches, complete = shell.expand_glob(f"{tree}/docs/*.md", "/")
+    assert matches == [f"{tree}/docs/readme.md"]
+    assert complete
+
+
+def test_expand_glob_stops_at_max_results(shell, tmp_path):
+    for i in range(30):
+        (tmp_path / f"{i:02}.csv").write_text("")
+    matches, complete = shell.expand_glob("*.csv", str(tmp_path), max_results=20)
+    assert matches == [f"{i:02}.csv" for i in range(20)]
+    assert not complete
+
+
+@pytest.mark.parametrize("pattern", ["*.csv", "*/"])
+def test_expand_glob_exactly_max_results_is_complete(shell, tmp_path, pattern):
+    for i in range(20):
+        if pattern == "*/":
+            (tmp_path / f"{i:02}.csv").mkdir()
+        else:
+            (tmp_path / f"{i:02}.csv").write_text("")
+    matches, complete = shell.expand_glob(pattern, str(tmp_path), max_results=20)
+    assert len(matches) == 20
+    assert complete
+
+
+def test_expand_glob_stops_at_max_results_across_directories(shell, tmp_path):
+    for d in range(3):
+        for i in range(10):
+            (tmp_path / f"d{d}" / f"{i}.csv").parent.mkdir(exist_ok=True)
+            (tmp_path / f"d{d}" / f"{i}.csv").write_text("")
+    matches, complete = shell.expand_glob("*/*.csv", str(tmp_path), max_results=15)
+    assert len(matches) == 15
+    assert not complete
+
+
+def test_expand_glob_time_budget(shell, tree):
+    assert shell.expand_glob("**/*", str(tree), time_budget=-1) == ([], False)
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+GIT_HELP = """\
+usage: git [-v | --version] [-h | --help] [-C <path>]
+
+These are common Git commands used in various situations:
+
+start a working area (see also: git help tutorial)
+   clone     Clone a repository into a new directory
+   init      Create an empty Git repository
+
+work on the current change (see also: git help everyday)
+   add       Add file contents to the index
+"""
+
+SYSTEMCTL_HELP = """\
+systemctl [OPTIONS...] COMMAND ...
+
+Query or send control commands to the system manager.
+
+Unit Commands:
+  list-units [PATTERN...]              List units currently in memory
+  start UNIT...                        Start (activate) one or more units
+  kill UNIT...                         Send signal to processes of a unit
+  set-property UNIT PROPERTY=VALUE...  Sets one or more properties of a unit
+  cat <unit>                           Show files and drop-ins of units
+  daemon-reload                        Reload systemd manager configuration
+
+Options:
+  -t --type=TYPE         List units of a particular type
+  -a --all               Show all properties/all units
+"""
+
+# A multicall script, like busybox, whose help depends on the name it runs as
+MULTICALL = """\
+#!/bin/sh
+name=$(basename "$0")
+echo "Usage: $name [options]"
+echo "  --$name-only   only for $name"
+if [ "$name" = tool ]; then
+    echo "Commands:"
+    echo "  build    Build it"
+    echo "  test     Test it"
+fi
+"""
+
+
+def test_parse_help_output_git(shell):
+    spec = shell.parse_help_output(GIT_HELP)
+    assert spec["subcommands"] == ["clone", "init", "add"]
+    assert spec["flags"] == ["--help", "--version", "-C", "-h", "-v"]
+
+
+def test_parse_help_output_argument_specs(shell):
+    spec = shell.parse_help_output(SYSTEMCTL_HELP)
+    assert spec["subcommands"] == ["list-units", "start", "kill", "set-property", "cat", "daemon-reload"]
+    assert {"--type", "--all", "-t", "-a"} <= set(spec["flags"])
+
+
+def test_parse_help_output_aliases(shell):
+    spec = shell.parse_help_output("Commands:\n  remove, rm   Remove a thing\n  list*    List things\n")
+    assert spec["subcommands"] == ["remove", "rm", "list"]
+
+
+@pytest.fixture
+def commands(shell, tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "multicall"
+    script.write_text(MULTICALL)
+    script.chmod(0o755)
+    for name in ("tool", "alpha", "beta", "unlisted"):
+        os.symlink(script, bin_dir / name)
+    monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+    monkeypatch.setattr(shell, "HELP_COMMANDS", frozenset({"tool", "alpha", "beta"}))
+    return shell.HelpCompletionCache(str(tmp_path / "cache"))
+
+
+def test_lookup_subcommands(commands):
+    spec, more = commands.lookup(["tool"])
+    assert spec["subcommands"] == ["build", "test"]
+    assert more
+    spec, more = commands.lookup(["tool", "build", "x"])
+    assert not more
+
+
+def test_lookup_runs_multicall_commands_by_name(commands):
+    alpha, _ = commands.lookup(["alpha"])
+    beta, _ = commands.lookup(["beta"])
+    assert alpha["flags"] == ["--alpha-only"]
+    assert beta["flags"] == ["--beta-only"]
+
+
+def test_lookup_only_runs_allowed_commands(commands, tmp_path):
+    assert commands.lookup(["unlisted"]) == ({"subcommands": [], "flags": []}, False)
+    assert commands.lookup([str(tmp_path / "bin" / "tool")]) == ({"subcommands": [], "flags": []}, False)
+    assert not (tmp_path / "cache").exists()
+
+
+def test_lookup_caches_on_disk(shell, commands, tmp_path):
+    spec, _ = commands.lookup(["alpha"])
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+    # A new cache reads the file rather than running --help again, as long
+    # as the binary's mtime is unchanged
+    script = tmp_path / "bin" / "multicall"
+    mtime = script.stat().st_mtime_ns
+    script.write_text("#!/bin/sh\n")
+    os.utime(script, ns=(mtime, mtime))
+    assert shell.HelpCompletionCache(str(tmp_path / "cache")).lookup(["alpha"])[0] == spec
+
+    os.utime(script, ns=(mtime + 10**9, mtime + 10**9))
+    assert shell.HelpCompletionCache(str(tmp_path / "cache")).lookup(["alpha"])[0]["flags"] == []
@@ -0,0 +1,94 @@
+import subprocess
+
+import pytest
+
+
+def start_group(cmd):
+    return subprocess.Popen(cmd, shell=True, start_new_session=True)
+
+
+def test_prune_process_groups(shell):
+    running = start_group("sleep 30")
+    finished = start_group("true")
+    finished.wait()
+    try:
+        pgids = {running.pid, finished.pid}
+        shell.prune_process_groups(pgids)
+        assert pgids == {running.pid}
+    finally:
+        running.kill()
+        running.wait()
+
+
+def test_prune_process_groups_keeps_group_outliving_its_leader(shell):
+    # The shell exits at once, leaving its background sleep in the group
+    leader = start_group("sleep 30 & exit 0")
+    leader.wait()
+    pgids = {leader.pid}
+    shell.prune_process_groups(pgids)
+    assert pgids == {leader.pid}
+    assert shell.kill_process_groups(pgids) == 1
+    assert pgids == set()
+
+
+def test_kill_process_groups(shell):
+    proc = start_group("sleep 30")
+    pgids = {proc.pid}
+    assert shell.kill_process_groups(pgids, reap=proc.poll) == 1
+    assert pgids == set()
+    assert proc.returncode is not None
+
+
+def test_kill_process_groups_escalates_to_sigkill(shell, monkeypatch):
+    monkeypatch.setattr(shell, "KILL_GRACE_PERIOD", 0.2)
+    proc = start_group("trap '' TERM; sleep 30 & wait")
+    pgids = {proc.pid}
+    assert shell.kill_process_groups(pgids, reap=proc.poll) == 1
+    assert not shell.process_group_alive(proc.pid)
+
+
+def entry(entry_id, output):
+    return {"id": entry_id, "prompt": "$ ", "command": f"cmd {entry_id}", "output": output, "success": True}
+
+
+def test_spill_scrollback_round_trips(shell, tmp_path):
+    index = shell.ScrollbackIndex()
+    entries = [entry(0, "first ünïcode line"), entry(1, "secret=hunter2\nmore")]
+    for e in entries:
+        index.add(e["id"], e)
+    shell.index_executor.submit(lambda: None).result()
+
+    path = tmp_path / "spill" / "session.jsonl"
+    written = shell.spill_scrollback(str(path), entries, index)
+    assert written == path.stat().st_size
+    assert index.entries == {}
+
+    results, _ = index.search("cmd")
+    assert [(entry, spilled) for _, entry, _, spilled in results] == [(entries[1], True), (entries[0], True)]
+    assert [entry for _, entry, _, _ in index.search("ünïcode")[0]] == [entries[0]]
+
+    # Appending keeps earlier offsets valid
+    later = entry(2, "later")
+    index.add(2, later)
+    shell.spill_scrollback(str(path), [later], index)
+    assert [entry["id"] for _, entry, _, _ in index.search("cmd")[0]] == [2, 1, 0]
+
+
+def test_spill_scrollback_is_private(shell, tmp_path):
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir(mode=0o755)
+    spill_dir.chmod(0o755)
+    path = spill_dir / "session.jsonl"
+    shell.spill_scrollback(str(path), [entry(0, "x")], shell.ScrollbackIndex())
+    assert spill_dir.stat().st_mode & 0o777 == 0o700
+    assert path.stat().st_mode & 0o777 == 0o600
+
+
+def test_spill_scrollback_refuses_symlink(shell, tmp_path):
+    target = tmp_path / "elsewhere"
+    target.write_text("")
+    (tmp_path / "spill").mkdir()
+    (tmp_path / "spill" / "session.jsonl").symlink_to(target)
+    with pytest.raises(OSError):
+        shell.spill_scrollback(str(tmp_path / "spill" / "session.jsonl"), [entry(0, "x")], shell.ScrollbackIndex())
+    assert target.read_text() == ""
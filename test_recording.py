@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+
+def record(shell, path, count, compress=False):
+    # Events one second apart, starting at about 1s
+    recorder = shell.SessionRecorder(str(path), compress=compress)
+    for i in range(count):
+        recorder.started -= 1
+        recorder.event("o", f"line {i}\r\n")
+    return recorder
+
+
+@pytest.mark.parametrize("compress, name", [(False, "session.cast"), (True, "session.cast.gz")])
+def test_read_recording(shell, tmp_path, compress, name):
+    record(shell, tmp_path / name, 5, compress).close()
+    header, events, next_time = shell.read_recording(str(tmp_path / name))
+    assert header["version"] == 2
+    assert [data for _, _, data in events] == [f"line {i}\r\n" for i in range(5)]
+    assert next_time is None
+
+
+@pytest.mark.parametrize("compress, name", [(False, "session.cast"), (True, "session.cast.gz")])
+def test_read_recording_pages(shell, tmp_path, compress, name):
+    record(shell, tmp_path / name, 5, compress).close()
+    _, events, next_time = shell.read_recording(str(tmp_path / name), limit=2)
+    assert [data for _, _, data in events] == ["line 0\r\n", "line 1\r\n"]
+    _, events, _ = shell.read_recording(str(tmp_path / name), start=next_time, limit=2)
+    assert [data for _, _, data in events] == ["line 2\r\n", "line 3\r\n"]
+
+
+def test_replay_while_recording_compressed(shell, tmp_path):
+    path = tmp_path / "live.cast.gz"
+    recorder = record(shell, path, 3, compress=True)
+    recorder.flush()
+    _, events, next_time = shell.read_recording(str(path))
+    assert [data for _, _, data in events] == ["line 0\r\n", "line 1\r\n", "line 2\r\n"]
+    assert next_time is None
+
+    recorder.event("o", "line 3\r\n")
+    recorder.flush()
+    _, events, _ = shell.read_recording(str(path))
+    assert len(events) == 4
+    recorder.close()
+
+
+@pytest.mark.parametrize("compress, name", [(False, "session.cast"), (True, "session.cast.gz")])
+def test_read_recording_seeks_from_index(shell, tmp_path, monkeypatch, compress, name):
+    monkeypatch.setattr(shell, "RECORDING_CHECKPOINT_BYTES", 40)
+    path = tmp_path / name
+    record(shell, path, 20, compress).close()
+    seek_points = [json.loads(line) for line in (tmp_path / f"{name}.idx").read_text().splitlines()]
+    assert len(seek_points) > 2
+
+    t = seek_points[-1][0]
+    _, events, next_time = shell.read_recording(str(path), start=t)
+    assert events[0][0] >= t
+    assert events[-1][2] == "line 19\r\n"
+    assert next_time is None
+
+
+@pytest.mark.parametrize("text, seconds", [("90", 90.0), ("1:30", 90.0), ("1:00:05.5", 3605.5)])
+def test_parse_timestamp(shell, text, seconds):
+    assert shell.parse_timestamp(text) == seconds
+
+
+def test_format_timestamp(shell):
+    assert shell.format_timestamp(3605.5) == "1:00:05.500"
+
+
+def test_recording_stops_on_write_error(shell, tmp_path):
+    recorder = record(shell, tmp_path / "session.cast", 1)
+    recorder.flush()
+    # Every write to /dev/full fails with ENOSPC
+    recorder.raw.close()
+    recorder.raw = recorder.writer = open("/dev/full", "ab")
+    recorder.event("o", "lost\r\n")
+    recorder.flush()
+    assert isinstance(recorder.error, OSError)
+
+    recorder.event("o", "ignored\r\n")
+    assert recorder.buffer == []
+    recorder.flush()
+    recorder.close()
+    _, events, _ = shell.read_recording(str(tmp_path / "session.cast"))
+    assert [data for _, _, data in events] == ["line 0\r\n"]
+
+
+def test_read_recording_skips_early_events_without_decoding(shell, tmp_path, monkeypatch):
+    record(shell, tmp_path / "session.cast", 5).close()
+    decoded = []
+    loads = json.loads
+    monkeypatch.setattr(shell.json, "loads", lambda text: decoded.append(text) or loads(text))
+    _, events, next_time = shell.read_recording(str(tmp_path / "session.cast"), start=3.5, limit=1)
+    assert [data for _, _, data in events] == ["line 3\r\n"]
+    # Of the events, only the one returned and the one giving next_time
+    assert [text for text in decoded if isinstance(text, bytes)] == [
+        json.dumps(event).encode() + b"\n" for event in events + [[next_time, "o", "line 4\r\n"]]
+    ]
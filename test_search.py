@@ -0,0 +1,104 @@
+import json
+import re
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        ("hello world", ["hello world"]),
+        ("foo.*bar", ["foo", "bar"]),
+        ("colou?r", ["colo"]),
+        (r"error\d+: disk", ["error", ": disk"]),
+        ("abc[0-9]def", ["abc", "def"]),
+        (r"[abc\]def]ghi", ["ghi"]),
+        ("[]xyz]ghi", ["ghi"]),
+        ("[^]xyz]ghi", ["ghi"]),
+        ("abc[de", []),
+        ("foo(bar)+baz", ["foo", "bar", "baz"]),
+        # Optional or repeated groups contribute nothing
+        ("(abc)?def", ["def"]),
+        ("((ab)cde)*xyz", ["xyz"]),
+        ("(abc){0,2}def", ["def"]),
+        ("a{2,3}bcd", ["bcd"]),
+        # Anything fancier disables narrowing
+        ("(?!foo)bar", []),
+        ("(?i)abc", []),
+        ("abc|def", []),
+        ("abc)def", []),
+    ],
+)
+def test_regex_literals(shell, pattern, expected):
+    assert shell.regex_literals(pattern) == expected
+
+
+@pytest.mark.parametrize(
+    "pattern, text",
+    [
+        ("(abc)?def", "xyzdef"),
+        ("(?!foo)bar", "bar"),
+        ("x(yz)*def", "xyzdef"),
+        ("(abc){0}def", "xyzdef"),
+        (r"[abc\]def]ghi", "aghi"),
+    ],
+)
+def test_regex_literals_are_in_every_match(shell, pattern, text):
+    match = re.search(pattern, text)
+    assert match is not None
+    for literal in shell.regex_literals(pattern):
+        assert literal in match.group(0)
+
+
+def entry(command, output):
+    return {"prompt": "$ ", "command": command, "output": output, "success": True}
+
+
+@pytest.fixture
+def index(shell):
+    index = shell.ScrollbackIndex()
+    index.add(0, entry("ls", "alpha.txt\nbeta.txt"))
+    index.add(1, entry("cat log", "xyzdef\nERROR disk full"))
+    index.add(2, entry("echo hi", "hi"))
+    shell.index_executor.submit(lambda: None).result()
+    return index
+
+
+def found(results):
+    return [entry_id for entry_id, *_ in results]
+
+
+def test_search_plain_text_newest_first(index):
+    results, more = index.search(".txt")
+    assert found(results) == [0]
+    assert not more
+    results, more = index.search("i")
+    assert found(results) == [2, 1]
+
+
+def test_search_case_sensitivity(index):
+    assert found(index.search("error disk")[0]) == [1]
+    assert found(index.search("error disk", case_sensitive=True)[0]) == []
+
+
+def test_search_regex_with_optional_group(index):
+    # The trigram index must not demand "abc"
+    assert found(index.search("(abc)?def", regex=True)[0]) == [1]
+    assert found(index.search("(?!foo)def", regex=True)[0]) == [1]
+
+
+def test_search_limit(index):
+    results, more = index.search("t", limit=1)
+    assert found(results) == [1]
+    assert more
+
+
+def test_search_spilled_entries(index, tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    spilled = entry("cat log", "xyzdef\nERROR disk full")
+    spill.write_text("\n" + json.dumps(spilled) + "\n")
+    index.spill(1, str(spill), 1)
+    results, _ = index.search("disk full")
+    assert [(entry_id, entry["command"], was_spilled) for entry_id, entry, _, was_spilled in results] == [
+        (1, "cat log", True)
+    ]
@@ -0,0 +1,103 @@
+import pytest
+
+
+def tokens(shell, text):
+    tokenizer = shell.CommandLineTokenizer().feed(text)
+    result = [(token["value"], token["operator"]) for token in tokenizer.tokens]
+    if tokenizer.current is not None:
+        result.append((tokenizer.current["value"], tokenizer.current["operator"]))
+    return result
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("ls -la  src", [("ls", False), ("-la", False), ("src", False)]),
+        ('cat "My Docs/report.txt"', [("cat", False), ("My Docs/report.txt", False)]),
+        ("cat My\\ Docs/x", [("cat", False), ("My Docs/x", False)]),
+        ("echo 'it'\\''s'", [("echo", False), ("it's", False)]),
+        ('echo "a\\"b\\n"', [("echo", False), ('a"b\\n', False)]),
+        ("a|b||c&&d;e", [("a", False), ("|", True), ("b", False), ("||", True), ("c", False),
+                         ("&&", True), ("d", False), (";", True), ("e", False)]),
+        ("ls 2>err >>out", [("ls", False), (">", True), ("err", False), (">>", True), ("out", False)]),
+        ("echo '2'>x", [("echo", False), ("2", False), (">", True), ("x", False)]),
+        ("echo a2>x", [("echo", False), ("a2", False), (">", True), ("x", False)]),
+        ('echo "a | b"', [("echo", False), ("a | b", False)]),
+    ],
+)
+def test_tokenize(shell, text, expected):
+    assert tokens(shell, text) == expected
+
+
+def test_open_quote(shell):
+    tokenizer = shell.CommandLineTokenizer().feed('cat "My Do')
+    assert tokenizer.current["quote"] == '"'
+    assert tokenizer.current["value"] == "My Do"
+
+
+def test_feed_resumes(shell):
+    tokenizer = shell.CommandLineTokenizer().feed('cat "My')
+    tokenizer.feed('cat "My Docs" x')
+    assert tokens(shell, 'cat "My Docs" x') == [
+        (token["value"], token["operator"]) for token in tokenizer.tokens + [tokenizer.current]
+    ]
+    # Text that doesn't extend the last feed starts over
+    tokenizer.feed("ls")
+    assert tokenizer.tokens == []
+    assert tokenizer.current["value"] == "ls"
+
+
+def test_word_end(shell):
+    tokenizer = shell.CommandLineTokenizer()
+    command = 'cat "My Docs/re" | wc'
+    tokenizer.feed(command[:14])
+    assert tokenizer.word_end(command, 14) == 16
+
+
+@pytest.mark.parametrize(
+    "command, cursor_pos, kind, word, quote, words_before",
+    [
+        ("", 0, "command", "", None, []),
+        ("gi", 2, "command", "gi", None, []),
+        ("ls | gr", 7, "command", "gr", None, []),
+        ("cd ", 3, "path", "", None, ["cd"]),
+        ('cat "My Docs/rep', 16, "path", "My Docs/rep", '"', ["cat"]),
+        ("cat My\\ Docs/re", 15, "path", "My Docs/re", None, ["cat"]),
+        ("echo $HO", 8, "env", "$HO", None, ["echo"]),
+        ('echo "${HO', 10, "env", "${HO", None, ["echo"]),
+        ("echo '$HO", 9, "path", "$HO", "'", ["echo"]),
+        ("ls > da", 7, "redirect", "da", None, ["ls"]),
+        ("ls >out da", 10, "path", "da", None, ["ls"]),
+        ("FOO=1 git comm", 14, "path", "comm", None, ["git"]),
+        ("cd data", 3, "path", "", None, ["cd"]),
+    ],
+)
+def test_completion_context(shell, command, cursor_pos, kind, word, quote, words_before):
+    context = shell.get_completion_context(shell.CommandLineTokenizer(), command, cursor_pos)
+    assert (context["kind"], context["word"], context["quote"], context["words_before"]) == (
+        kind, word, quote, words_before
+    )
+
+
+def test_completion_context_bounds(shell):
+    # The whole quoted word is replaced, even past the cursor
+    context = shell.get_completion_context(shell.CommandLineTokenizer(), 'cat "My Docs/re" | wc', 14)
+    assert (context["start"], context["end"]) == (4, 16)
+    # Only $NAME is replaced in an env completion
+    context = shell.get_completion_context(shell.CommandLineTokenizer(), "echo x$HO", 9)
+    assert (context["start"], context["end"], context["word"]) == (6, 9, "$HO")
+
+
+@pytest.mark.parametrize(
+    "value, quote, closed, expected",
+    [
+        ("My Docs/report.txt", None, True, "My\\ Docs/report.txt"),
+        ("a&b(1).txt", None, True, "a\\&b\\(1\\).txt"),
+        ("My Docs/report.txt", '"', True, '"My Docs/report.txt"'),
+        ("My Docs/", '"', False, '"My Docs/'),
+        ('a"$b', '"', True, '"a\\"\\$b"'),
+        ("it's", "'", True, "'it'\\''s'"),
+    ],
+)
+def test_quote_completion(shell, value, quote, closed, expected):
+    assert shell.quote_completion(value, quote, closed) == expected
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=-100", (900, 999)),
+        ("bytes=-5000", (0, 999)),
+        ("bytes=900-5000", (900, 999)),
+        ("bytes=1000-", False),
+        ("bytes=5-2", False),
+        ("bytes=-", None),
+        ("bytes=0-1,5-6", None),
+        ("items=0-1", None),
+    ],
+)
+def test_parse_range(shell, header, expected):
+    assert shell.parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize(
+    "size, expected",
+    [(0, "0 B"), (1023, "1023 B"), (1536, "1.5 KB"), (5 * 1024**2, "5.0 MB"), (2 * 1024**4, "2048.0 GB")],
+)
+def test_format_size(shell, size, expected):
+    assert shell.format_size(size) == expected
+
+
+def test_iter_file_range(shell, tmp_path, monkeypatch):
+    monkeypatch.setattr(shell, "DOWNLOAD_CHUNK_BYTES", 4)
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(20)))
+    assert list(shell.iter_file_range(str(path), 2, 11)) == [bytes(range(2, 6)), bytes(range(6, 10)), bytes([10, 11])]
+
+
+def download(shell, path, **headers):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    }
+    response = shell.file_download_response(Request(scope), str(path))
+
+    if not hasattr(response, "body_iterator"):
+        return response, response.body
+
+    async def body():
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    return response, asyncio.run(body())
+
+
+def test_file_download_response(shell, tmp_path):
+    path = tmp_path / "report final.txt"
+    path.write_bytes(b"0123456789")
+
+    response, body = download(shell, path)
+    assert response.status_code == 200
+    assert body == b"0123456789"
+    assert response.headers["content-disposition"] == "attachment; filename*=UTF-8''report%20final.txt"
+
+    response, body = download(shell, path, range="bytes=4-")
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 4-9/10"
+    assert body == b"456789"
+
+    # A changed file is sent whole rather than resumed
+    response, body = download(shell, path, range="bytes=4-", if_range='"stale"')
+    assert response.status_code == 200
+    assert body == b"0123456789"
+
+    response, _ = download(shell, path, range="bytes=20-")
+    assert response.status_code == 416
+
+    response, _ = download(shell, tmp_path / "missing.txt")
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize(
+    "cmd, expected",
+    [
+        ("download a.txt", ["a.txt"]),
+        ('download "My Docs/a.txt"', ["My Docs/a.txt"]),
+        ("download My\\ Docs/a.txt", ["My Docs/a.txt"]),
+        ("upload", []),
+        ("upload 'in box' extra", ["in box", "extra"]),
+    ],
+)
+def test_command_args(shell, cmd, expected):
+    assert shell.command_args(cmd) == expected
+
+
+def test_unused_path(shell, tmp_path):
+    path = tmp_path / "report.txt"
+    assert shell.unused_path(str(path)) == str(path)
+    path.write_text("")
+    assert shell.unused_path(str(path)) == str(tmp_path / "report (1).txt")
+    (tmp_path / "report (1).txt").write_text("")
+    assert shell.unused_path(str(path)) == str(tmp_path / "report (2).txt")